@@ -0,0 +1,10 @@
+# coding: utf-8
+""" Benchmarks of terrain analysis and vector hot paths
+    on reproducible synthetic data.
+
+    Run from the repository root :
+
+        python -m benchmarks.run --output results.json
+
+    see `benchmarks.run` for options.
+"""
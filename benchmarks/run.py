@@ -0,0 +1,203 @@
+# coding: utf-8
+""" Run benchmarks, write JSON results
+    and compare them to a stored baseline.
+
+    Usage, from the repository root :
+
+        python -m benchmarks.run [--cases flowdir topology_polygons ...]
+                                 [--raster-sizes 1024 2048 ...]
+                                 [--vector-sizes 64 128 ...]
+                                 [--repeat 3] [--output results.json]
+                                 [--baseline benchmarks/baseline.json]
+                                 [--save-baseline] [--tolerance 0.1]
+
+    Each case and size runs in a fresh worker process,
+    so that its peak resident set size (RSS) is its own.
+    The exit status is 1 if any case is slower than the baseline
+    by more than `tolerance`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for module_path in ('src/ta', 'src/vector'):
+    if os.path.join(ROOT, module_path) not in sys.path:
+        sys.path.insert(0, os.path.join(ROOT, module_path))
+
+from benchmarks.suite import CASES, DEFAULT_CASES
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+def peak_rss():
+    """ Peak resident set size of this process, in MB
+    """
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == 'darwin':
+        return rss / 1024.0 / 1024.0
+
+    return rss / 1024.0
+
+def measure(name, size, repeat):
+    """
+    Worker process entry point: time case `name` at `size`,
+    keeping the best of `repeat` runs.
+    """
+
+    case = CASES[name]
+    result = { 'name': name, 'size': size, 'unit': case.unit }
+
+    try:
+        run, count = case.setup(size)
+    except ImportError as error:
+        result['skipped'] = str(error)
+        return result
+
+    setup_rss = peak_rss()
+    times = list()
+
+    for _ in range(repeat):
+        start = time.time()
+        run()
+        times.append(time.time() - start)
+
+    seconds = min(times)
+
+    result.update({
+        'count': count,
+        'seconds': seconds,
+        'throughput': count / seconds if seconds > 0 else float('inf'),
+        'setup_rss_mb': setup_rss,
+        'peak_rss_mb': peak_rss()
+    })
+
+    return result
+
+def run_case(name, size, repeat):
+    """ Run `measure` in a fresh worker process
+    """
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(measure, name, size, repeat).result()
+
+def machine():
+
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'processor': platform.processor(),
+        'cpus': multiprocessing.cpu_count()
+    }
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Cases slower than the baseline.
+
+    Parameters
+    ----------
+
+    results, baseline: list of results, see `measure`
+
+    tolerance: float
+        Allowed relative slowdown
+
+    Returns
+    -------
+
+    list of (result, ratio) for cases whose throughput,
+    relative to the baseline, is below 1 / (1 + tolerance)
+    """
+
+    reference = { (r['name'], r['size']): r for r in baseline if 'throughput' in r }
+    slower = list()
+
+    for result in results:
+
+        base = reference.get((result['name'], result['size']))
+
+        if base is None or 'throughput' not in result:
+            continue
+
+        ratio = result['throughput'] / base['throughput']
+        result['baseline_ratio'] = ratio
+
+        if ratio < 1.0 / (1.0 + tolerance):
+            slower.append((result, ratio))
+
+    return slower
+
+def report(result):
+
+    if 'skipped' in result:
+        return '%-20s %6d  skipped: %s' % (result['name'], result['size'], result['skipped'])
+
+    line = '%-20s %6d %14.0f %s/s %10.3f s %9.1f MB' % (
+        result['name'], result['size'], result['throughput'], result['unit'],
+        result['seconds'], result['peak_rss_mb'])
+
+    return line
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Run benchmarks on synthetic data')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=DEFAULT_CASES)
+    parser.add_argument('--raster-sizes', nargs='+', type=int, default=[ 1024, 2048 ],
+                        help='DEM sizes, eg. 1024 2048 4096 8192 16384')
+    parser.add_argument('--vector-sizes', nargs='+', type=int, default=[ 64, 128 ],
+                        help='Network sizes, in rows and columns of features')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='JSON results file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    results = list()
+
+    for name in args.cases:
+
+        sizes = args.raster_sizes if CASES[name].kind == 'raster' else args.vector_sizes
+
+        for size in sizes:
+            result = run_case(name, size, args.repeat)
+            results.append(result)
+            print report(result)
+
+    slower = list()
+
+    if os.path.exists(args.baseline) and not args.save_baseline:
+
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)['results']
+
+        slower = compare(results, baseline, args.tolerance)
+
+        for result, ratio in slower:
+            print 'SLOWER %-13s %6d  %.0f%% of baseline throughput' % (result['name'], result['size'], 100 * ratio)
+
+    document = { 'machine': machine(), 'results': results }
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(document, fp, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as fp:
+            json.dump(document, fp, indent=2)
+
+    return 1 if slower else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+# coding: utf-8
+""" Benchmark cases.
+
+    Each case is a setup function taking a size,
+    and returning the function to time and the number of items
+    (cells or vertices) it processes.
+    Setup, including data generation, is not timed.
+    Modules under test are imported in setup functions,
+    so that a case whose module cannot be imported is skipped.
+    Cases of the compiled `fct.terrain_analysis` extension
+    only run when asked for, see `DEFAULT_CASES`.
+"""
+
+from collections import OrderedDict
+import numpy as np
+
+from benchmarks.synthetic import fractal_dem, padded, polygon_network, line_network, fractal_line, count_vertices
+
+NODATA = -99999.0
+
+class Case(object):
+    """
+    Benchmark case.
+
+    Parameters
+    ----------
+
+    setup: callable
+        setup(size) returns (run, count)
+
+    kind: str
+        'raster', size being the number of rows and columns of the DEM,
+        or 'vector', size being the number of rows and columns
+        of the synthetic network
+
+    unit: str
+        Items counted in throughput, 'cells' or 'vertices'
+
+    default: bool
+        Whether the case runs when no case is given
+    """
+
+    def __init__(self, setup, kind, unit, default=True):
+
+        self.setup = setup
+        self.kind = kind
+        self.unit = unit
+        self.default = default
+
+def _flowdir(size):
+
+    from algs import fillsinks, flowdir
+
+    elevations = fractal_dem(size)
+    filled = fillsinks(elevations, NODATA, 1.0, 1.0)
+
+    return flowdir(padded(filled, NODATA), 1.0, 1.0, NODATA), filled
+
+def bench_flowdir(size):
+
+    from algs import flowdir
+
+    elevations = padded(fractal_dem(size), NODATA)
+
+    return (lambda: flowdir(elevations, 1.0, 1.0, NODATA)), size * size
+
+def bench_fillsinks(size):
+
+    from algs import fillsinks
+
+    elevations = fractal_dem(size)
+
+    return (lambda: fillsinks(elevations, NODATA, 1.0, 1.0)), size * size
+
+def bench_strahler(size):
+
+    from algs import strahler
+
+    flow, filled = _flowdir(size)
+
+    return (lambda: strahler(filled, flow, NODATA)), size * size
+
+def bench_watershed(size):
+
+    from algs import watershed
+
+    flow, _ = _flowdir(size)
+
+    return (lambda: watershed(flow, size // 2, size // 2, 1)), size * size
+
+def bench_watersheds(size):
+
+    from algs import watersheds
+
+    flow, _ = _flowdir(size)
+    rng = np.random.RandomState(0)
+    rows = rng.randint(0, size, 256)
+    cols = rng.randint(0, size, 256)
+    ids = np.arange(1, 257)
+
+    return (lambda: watersheds(flow, rows, cols, ids)), size * size
+
+def bench_hillshade(size):
+
+    from fct.terrain_analysis import hillshade
+
+    elevations = padded(fractal_dem(size), NODATA)
+    out = np.zeros((size, size), dtype=np.float32)
+
+    return (lambda: hillshade(elevations, 1.0, 1.0, NODATA, 315.0, 45.0, 1.0, out)), size * size
+
+def bench_gradient(size):
+
+    from fct.terrain_analysis import gradient
+
+    elevations = padded(fractal_dem(size), NODATA)
+    slope = np.zeros((size, size), dtype=np.float32)
+    aspect = np.zeros((size, size), dtype=np.float32)
+
+    return (lambda: gradient(elevations, 1.0, 1.0, NODATA, slope, aspect)), size * size
+
+def bench_max_slope(size):
+
+    from fct.terrain_analysis import max_slope
+
+    elevations = padded(fractal_dem(size), NODATA)
+    out = np.zeros((size, size), dtype=np.float32)
+
+    return (lambda: max_slope(elevations, out, 1.0, 1.0, NODATA)), size * size
+
+def bench_topology_polygons(size):
+
+    from topology import topology
+
+    geojson = polygon_network(size)
+
+    return (lambda: topology(geojson)), count_vertices(geojson)
+
+def bench_topology_lines(size):
+
+    from topology import topology
+
+    geojson = line_network(size)
+
+    return (lambda: topology(geojson)), count_vertices(geojson)
+
+def bench_pre_simplify(size):
+
+    from visvalingam import pre_simplify
+
+    line = fractal_line(size * size, seed=size)
+
+    return (lambda: pre_simplify(line)), len(line)
+
+CASES = OrderedDict([
+    ('flowdir', Case(bench_flowdir, 'raster', 'cells')),
+    ('fillsinks', Case(bench_fillsinks, 'raster', 'cells')),
+    ('strahler', Case(bench_strahler, 'raster', 'cells')),
+    ('watershed', Case(bench_watershed, 'raster', 'cells')),
+    ('watersheds', Case(bench_watersheds, 'raster', 'cells')),
+    ('hillshade', Case(bench_hillshade, 'raster', 'cells', default=False)),
+    ('gradient', Case(bench_gradient, 'raster', 'cells', default=False)),
+    ('max_slope', Case(bench_max_slope, 'raster', 'cells', default=False)),
+    ('topology_polygons', Case(bench_topology_polygons, 'vector', 'vertices')),
+    ('topology_lines', Case(bench_topology_lines, 'vector', 'vertices')),
+    ('pre_simplify', Case(bench_pre_simplify, 'vector', 'vertices'))
+])
+
+# Cases run when no case is given,
+# excluding those requiring the compiled extension
+DEFAULT_CASES = [ name for name, case in CASES.items() if case.default ]
@@ -0,0 +1,211 @@
+# coding: utf-8
+""" Reproducible synthetic inputs for benchmarks :
+    fractal digital elevation models, polygon and line networks.
+"""
+
+import numpy as np
+
+def fractal_dem(size, seed=0, roughness=0.8, relief=1000.0):
+    """
+    Fractal terrain by the diamond-square algorithm,
+    each refinement level being computed with array operations.
+
+    Parameters
+    ----------
+
+    size: int
+        Number of rows and columns
+
+    seed: int
+        Random seed, the same seed giving the same terrain
+
+    roughness: float
+        Decay exponent of the random displacement,
+        displacement being divided by 2**roughness at each level
+
+    relief: float
+        Elevation range of the result
+
+    Returns
+    -------
+
+    numpy-array, shape (size, size), dtype float32
+    """
+
+    rng = np.random.RandomState(seed)
+    levels = int(np.ceil(np.log2(max(size - 1, 1))))
+    m = (1 << levels) + 1
+
+    z = np.zeros((m, m), dtype=np.float32)
+    z[ ::m-1, ::m-1 ] = rng.uniform(-1, 1, (2, 2))
+
+    step = m - 1
+    scale = 1.0
+
+    while step > 1:
+
+        half = step // 2
+
+        # Diamond step: centers of squares
+
+        center = (z[ 0:-1:step, 0:-1:step ] + z[ 0:-1:step, step::step ] +
+                  z[ step::step, 0:-1:step ] + z[ step::step, step::step ]) / 4
+        z[ half::step, half::step ] = center + scale * rng.uniform(-1, 1, center.shape)
+        center = z[ half::step, half::step ]
+
+        # Square step: midpoints of horizontal edges,
+        # then of vertical edges, from 3 neighbors on the border
+
+        total = z[ 0::step, 0:-1:step ] + z[ 0::step, step::step ]
+        count = np.full(total.shape, 2, dtype=np.float32)
+        total[1:] += center
+        total[:-1] += center
+        count[1:] += 1
+        count[:-1] += 1
+        z[ 0::step, half::step ] = total / count + scale * rng.uniform(-1, 1, total.shape)
+
+        total = z[ 0:-1:step, 0::step ] + z[ step::step, 0::step ]
+        count = np.full(total.shape, 2, dtype=np.float32)
+        total[ :, 1: ] += center
+        total[ :, :-1 ] += center
+        count[ :, 1: ] += 1
+        count[ :, :-1 ] += 1
+        z[ half::step, 0::step ] = total / count + scale * rng.uniform(-1, 1, total.shape)
+
+        scale *= 2 ** -roughness
+        step = half
+
+    z = z[ :size, :size ]
+    z -= z.min()
+    z *= relief / max(z.max(), 1e-6)
+
+    return np.ascontiguousarray(z)
+
+def padded(elevations, nodata):
+    """
+    Copy of `elevations` with a 1-pixel border of `nodata`,
+    as expected by windowed kernels
+    """
+
+    out = np.full((elevations.shape[0] + 2, elevations.shape[1] + 2), nodata, dtype=elevations.dtype)
+    out[ 1:-1, 1:-1 ] = elevations
+
+    return out
+
+def _wiggle(start, end, count, amplitude, rng):
+    """
+    `count` vertices between `start` and `end` (excluded),
+    displaced at random across the segment, shape (..., count, 2)
+    """
+
+    t = (np.arange(1, count + 1, dtype=np.float64) / (count + 1))[ :, np.newaxis ]
+    start = start[ ..., np.newaxis, : ]
+    end = end[ ..., np.newaxis, : ]
+
+    normal = (end - start)[ ..., ::-1 ] * [ -1, 1 ]
+    offset = amplitude * rng.uniform(-1, 1, start.shape[:-2] + (count, 1))
+
+    return start + t * (end - start) + offset * normal
+
+def polygon_network(n, seed=0, vertices=8, jitter=0.3):
+    """
+    FeatureCollection of n x n adjacent quadrilateral polygons
+    on a jittered grid, each side having `vertices` interior vertices
+    shared with the neighboring polygon.
+    """
+
+    rng = np.random.RandomState(seed)
+    nodes = np.stack(np.meshgrid(np.arange(n + 1.0), np.arange(n + 1.0)), axis=-1)
+    nodes += rng.uniform(-jitter, jitter, nodes.shape)
+
+    # Interior vertices of horizontal edges (i, j) -> (i, j+1)
+    # and vertical edges (i, j) -> (i+1, j)
+
+    horizontal = _wiggle(nodes[ :, :-1 ], nodes[ :, 1: ], vertices, 0.05, rng)
+    vertical = _wiggle(nodes[ :-1, : ], nodes[ 1:, : ], vertices, 0.05, rng)
+
+    features = list()
+
+    for i in range(n):
+        for j in range(n):
+
+            ring = np.concatenate([
+                nodes[ i, j ][ np.newaxis ], horizontal[ i, j ],
+                nodes[ i, j+1 ][ np.newaxis ], vertical[ i, j+1 ],
+                nodes[ i+1, j+1 ][ np.newaxis ], horizontal[ i+1, j ][ ::-1 ],
+                nodes[ i+1, j ][ np.newaxis ], vertical[ i, j ][ ::-1 ],
+                nodes[ i, j ][ np.newaxis ]
+            ])
+
+            features.append({
+                'type': 'Feature',
+                'id': i*n + j,
+                'properties': { 'row': i, 'col': j },
+                'geometry': { 'type': 'Polygon', 'coordinates': [ ring.tolist() ] }
+            })
+
+    return { 'type': 'FeatureCollection', 'features': features }
+
+def line_network(n, seed=0, vertices=16, jitter=0.3):
+    """
+    FeatureCollection of a tree-like network of n x n - 1 lines
+    (reaches) on a jittered grid, each node draining to its left
+    or lower neighbor, reaches meeting at shared end points.
+    """
+
+    rng = np.random.RandomState(seed)
+    nodes = np.stack(np.meshgrid(np.arange(n + 0.0), np.arange(n + 0.0)), axis=-1)
+    nodes += rng.uniform(-jitter, jitter, nodes.shape)
+    left = rng.rand(n, n) < 0.5
+
+    features = list()
+
+    for i in range(n):
+        for j in range(n):
+
+            if i == 0 and j == 0:
+                continue
+
+            if j > 0 and (left[ i, j ] or i == 0):
+                target = (i, j-1)
+            else:
+                target = (i-1, j)
+
+            start = nodes[ i, j ]
+            end = nodes[ target ]
+            middle = _wiggle(start, end, vertices, 0.1, rng)
+            line = np.concatenate([ start[ np.newaxis ], middle, end[ np.newaxis ] ])
+
+            features.append({
+                'type': 'Feature',
+                'id': i*n + j,
+                'properties': { 'row': i, 'col': j },
+                'geometry': { 'type': 'LineString', 'coordinates': line.tolist() }
+            })
+
+    return { 'type': 'FeatureCollection', 'features': features }
+
+def fractal_line(count, seed=0):
+    """
+    Random walk of `count` vertices, shape (count, 2)
+    """
+
+    rng = np.random.RandomState(seed)
+    return np.cumsum(rng.normal(size=(count, 2)), axis=0)
+
+def count_vertices(geojson):
+    """
+    Number of vertices of the lines and rings of a FeatureCollection
+    of LineString and Polygon features
+    """
+
+    total = 0
+
+    for feature in geojson['features']:
+        geometry = feature['geometry']
+        if geometry['type'] == 'Polygon':
+            total += sum(len(ring) for ring in geometry['coordinates'])
+        else:
+            total += len(geometry['coordinates'])
+
+    return total
@@ -15,6 +15,7 @@ Constants & common routines
 
 import array
 import sys
+import multiprocessing
 from cpython cimport array
 from libc.math cimport sqrt, atan, atan2, pi, cos, sin, tan, acos, lround
 from libcpp.map cimport map
@@ -41,7 +42,7 @@ cdef inline bint ingrid(long height, long width, long i, long j) nogil:
 
     return (i >= 0) and (i < height) and (j >= 0) and (j < width)
 
-cdef inline bint ingrid3x3(long height, long width, long i, long j) nogil:
+cdef inline bint ingrid3x3(long height, long width, long i, long j) noexcept nogil:
 
     return (i >= 1) and (i < height-1) and (j >= 1) and (j < width-1)
 
@@ -74,6 +75,17 @@ cdef double[:, :] distance_2d(double rx, double ry):
 
     return r
 
-cdef double deg2rad(double x) nogil:
+cdef double deg2rad(double x) noexcept nogil:
 
-    return x * pi / 180
\ No newline at end of file
+    return x * pi / 180
+
+cdef int parallel_threads(int num_threads):
+    """
+    Number of threads to use for a requested `num_threads`,
+    0 or less meaning all available cores.
+    """
+
+    if num_threads <= 0:
+        return multiprocessing.cpu_count()
+
+    return num_threads
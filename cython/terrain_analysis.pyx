@@ -43,4 +43,9 @@ include "shortest_ref.pxi"
 include "shortest_ref_ws.pxi"
 include "signed_distance.pxi"
 include "subgrid.pxi"
-include "disaggregate.pxi"
\ No newline at end of file
+include "disaggregate.pxi"
+
+# OpenMP kernels, from src/ta
+include "slope.pxi"
+include "hillshade.pxi"
+include "derivatives.pxi"
\ No newline at end of file
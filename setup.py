@@ -22,11 +22,13 @@ extensions = [
         # [ 'ta/terrain_analysis.pyx', 'ta/common.pxi', 'ta/cfilldem.pxi', 'ta/cflowdir.pxi', 'ta/cwatershed.pxi', 'ta/cstrahler.pxi', 'ta/CppTermProgress.cpp' ],
         [ 'cython/terrain_analysis.pyx' ],
         language='c++',
-        include_dirs=[ 'src/cpp', numpy.get_include() ])
+        include_dirs=[ 'src/cpp', numpy.get_include() ],
+        extra_compile_args=[ '-fopenmp' ],
+        extra_link_args=[ '-fopenmp' ])
 ]
 
 setup(
     name = "fct_terrain_analysis",
     version=version,
-    ext_modules = cythonize(extensions)
+    ext_modules = cythonize(extensions, include_path=[ 'cython', 'src/ta' ])
 )
@@ -4,7 +4,6 @@
 """
 
 import numpy as np
-from heapq import heapify, heappop, heappush
 from progress import ProgressBar, TermProgressBar
 
 # D8 directions in 3x3 neighborhood
@@ -50,7 +49,7 @@ def distance_2d(rx, ry):
     
     return np.sqrt(dx**2 + dy**2)
 
-def flowdir(elevations, rx, ry, nodata, out=None):
+def flowdir(elevations, rx, ry, nodata, out=None, strip=1024):
     """
     Compute the D8 flow direction,
     ie. the direction of the neighbor cell having the maximum z gradient (slope).
@@ -64,11 +63,17 @@ def flowdir(elevations, rx, ry, nodata, out=None):
     -------------------------
     SW=32  |  S=16   |  SE=8
 
+    The eight neighbor gradients are computed at once
+    from shifted views of the padded elevation array,
+    one strip of `strip` rows at a time,
+    so that temporary arrays never exceed a few strips in size.
+
     Parameters
     ----------
 
     elevations: array-like, dtype float
-        z values from digital elevation model (DEM)
+        z values from digital elevation model (DEM),
+        1-pixel padded with nodata with respect to `out`'s shape
 
     rx: float
         Cell resolution in x direction
@@ -82,33 +87,56 @@ def flowdir(elevations, rx, ry, nodata, out=None):
     out: array-like
         Output raster, dtype uint8, initialized to 0
 
+    strip: int
+        Number of rows processed at once
+
     Returns
     -------
 
     D8 flow direction raster, given as power of 2, with no-data = 0
     N = 2^0 = 1, NE = 2^1 = 2, ..., NW = 2^7 = 128
+
+    Notes
+    -----
+
+    No-data neighbors are treated as infinitely deep,
+    so that cells on the edge of the data drain out of the raster.
+    Ties are resolved in row-major order of the 3x3 neighborhood.
     """
 
-    rows = elevations.shape[0]
-    cols = elevations.shape[1]
+    if out is None:
+        out = np.zeros((elevations.shape[0]-2, elevations.shape[1]-2), dtype=np.uint8)
+
+    rows = out.shape[0]
+    cols = out.shape[1]
     d2d = distance_2d(rx, ry)
 
-    if out is None:
+    for r0 in range(0, rows, strip):
 
-        out = np.zeros(elevations.shape, dtype=np.uint8)
+        r1 = min(r0 + strip, rows)
+        window = elevations[ r0:r1+2, 0:cols+2 ]
+        z = window[ 1:-1, 1:-1 ]
 
-    for i in range(rows):
-        for j in range(cols):
-            
-            z = elevations[i+1, j+1]
-            if z == nodata:
-                # out[i, j] = 0
+        smin = np.full(z.shape, np.inf)
+        direction = np.zeros(z.shape, dtype=np.uint8)
+
+        for s in range(9):
+
+            if s == 4:
                 continue
 
-            dz = elevations[ i:i+3, j:j+3 ] - z
-            s = np.argmin(dz / d2d)
+            di, dj = divmod(s, 3)
+            zx = window[ di:di+r1-r0, dj:dj+cols ]
+
+            sx = (zx - z) / d2d[ di, dj ]
+            sx[ zx == nodata ] = -np.inf
+
+            steeper = sx < smin
+            smin[ steeper ] = sx[ steeper ]
+            direction[ steeper ] = d8_directions[s]
 
-            out[i, j] = d8_directions[s]
+        valid = (z != nodata)
+        out[ r0:r1 ][ valid ] = direction[ valid ]
 
     return out
 
@@ -168,86 +196,250 @@ def upcells(flowdir, i, j):
         if ingrid(flowdir, ni, nj) and flowdir[ni,nj] == upward[k]:
             yield (ni, nj)
 
-def strahler(elevations, flowdir, nodata, out=None):
+def downstream(flowdir, strip=1024):
+    """ Flat index of the cell each cell flows to,
+    in the up-down direction given by flowdir.
+
+    Parameters
+    ----------
+
+    flowdir: array-like, ndim=2, dtype=uint8
+        D8 flow direction raster, no-data = 0
+
+    strip: int
+        Number of rows processed at once
+
+    Returns
+    -------
+
+    numpy-array, ndim=1, dtype=int64
+        Row-major flat index of the downstream cell,
+        or -1 for no-data cells and for cells flowing
+        out of the raster or into no-data.
     """
-    Strahler order,
+
+    height = flowdir.shape[0]
+    width = flowdir.shape[1]
+
+    # D8 code -> search direction, -1 for invalid codes
+    direction = np.full(256, -1, dtype=np.int8)
+    direction[ np.power(2, np.arange(8)) ] = np.arange(8)
+
+    di = np.array(ci + [ 0 ], dtype=np.int64)
+    dj = np.array(cj + [ 0 ], dtype=np.int64)
+
+    out = np.full(height*width, -1, dtype=np.int64)
+    cols = np.arange(width, dtype=np.int64)
+
+    for r0 in range(0, height, strip):
+
+        r1 = min(r0 + strip, height)
+        x = direction[ flowdir[ r0:r1 ] ]
+        rows = np.arange(r0, r1, dtype=np.int64)[ :, np.newaxis ]
+
+        ix = rows + di[x]
+        jx = cols + dj[x]
+        connected = (x >= 0) & (ix >= 0) & (ix < height) & (jx >= 0) & (jx < width)
+
+        out[ r0*width:r1*width ] = np.where(connected, ix*width + jx, -1).reshape(-1)
+
+    valid = (out >= 0)
+    valid[valid] = flowdir.reshape(-1)[ out[valid] ] != 0
+    out[ ~valid ] = -1
+
+    return out
+
+def topological_levels(flowdir, down=None):
+    """ Sort cells from sources to outlets,
+    in the up-down direction given by flowdir,
+    by removing cells with no remaining upward cells (Kahn's algorithm)
+    one level at a time.
+
+    Parameters
+    ----------
+
+    flowdir: array-like, ndim=2, dtype=uint8
+        D8 flow direction raster, no-data = 0
+
+    down: array-like
+        Precomputed `downstream(flowdir)`
+
+    Returns
+    -------
+
+    Generator of arrays of flat cell indices,
+    each cell coming after all its upward cells.
+    Cells on a flow direction cycle are never returned.
+    """
+
+    if down is None:
+        down = downstream(flowdir)
+
+    return _levels(down, flowdir.reshape(-1) != 0)
+
+def _levels(down, valid):
+    """ Kahn's algorithm over the forest given by `down`,
+    restricted to cells where `valid` is True,
+    see `topological_levels`.
+    """
+
+    n = down.shape[0]
+    connected = (down >= 0)
+    indegree = np.bincount(down[connected], minlength=n)
+
+    level = np.flatnonzero(valid & (indegree == 0))
+
+    while level.size:
+
+        yield level
+
+        targets = down[level]
+        targets, count = np.unique(targets[ targets >= 0 ], return_counts=True)
+        indegree[targets] -= count
+        level = targets[ indegree[targets] == 0 ]
+
+def _group_by(keys, values):
+    """ Sort values by key and return
+    unique keys, sorted values and start offset of each key group.
+    """
+
+    order = np.argsort(keys, kind='mergesort')
+    keys = keys[order]
+    values = values[order]
+    start = np.flatnonzero(np.concatenate([ [ keys.size > 0 ], keys[1:] != keys[:-1] ]))
+
+    return keys[start], values, start
+
+def stream_order(flowdir, method='strahler', out=None):
+    """
+    Strahler or Shreve stream order,
     assuming connection between cells in the up-down direction
     given by flowdir.
 
-    The elevation data is used to sort the input cells,
-    so as to process cells from top to down.
+    Cells are processed in topological order,
+    from sources to outlets, without any elevation data.
 
     Parameters
     ----------
 
-    elevations: array-like
-        Digital elevation model (DEM) raster (ndim=2)
+    flowdir: array-like, ndim=2, dtype=uint8
+        D8 flow direction raster, no-data = 0
 
-    flowdir: array-like
-        Same shape as elevations
-
-    nodata: float
-        No-data value of elevations
+    method: str
+        'strahler' or 'shreve'
 
     out: array-like
-        Output raster, dtype uint8,
-        same shape as elevations,
-        initialized to 1
+        Output raster, same shape as flowdir,
+        dtype uint8 for Strahler order, uint32 for Shreve magnitude
 
     Returns
     -------
 
-    Strahler order raster, no-data = 0
+    Stream order raster, no-data = 0.
+    Cells on a flow direction cycle are left to 0.
     """
 
-    height = elevations.shape[0]
-    width = elevations.shape[1]
+    if method not in ('strahler', 'shreve'):
+        raise ValueError('Unknown stream order method %s' % method)
 
-    if out is None:
-        out = np.ones(elevations.shape, dtype=np.uint8)
+    n = flowdir.shape[0] * flowdir.shape[1]
+    down = downstream(flowdir)
 
-    idx = elevations.reshape(height*width).argsort(kind='mergesort')
-    count = np.zeros(elevations.shape, dtype=np.uint8)
+    if method == 'strahler':
 
-    for k in xrange(height*width-1, -1, -1):
+        order = np.zeros(n, dtype=np.uint8)
+        upmax = np.zeros(n, dtype=np.uint8)
+        upcount = np.zeros(n, dtype=np.uint8)
 
-        x = idx[k]
-        i = x  % height
-        j = x // height
+        for level in topological_levels(flowdir, down):
 
-        z = elevations[ i, j ]
+            o = np.maximum(upmax[level], 1)
+            o[ upcount[level] > 1 ] += 1
+            order[level] = o
 
-        if z == nodata:
-            continue
+            connected = down[level] >= 0
+            if not np.any(connected):
+                continue
+
+            # maximum incoming order, and its multiplicity, per target cell
+            targets, o, start = _group_by(down[level][connected], o[connected])
+            omax = np.maximum.reduceat(o, start)
+            size = np.diff(np.append(start, o.size))
+            k = np.add.reduceat((o == np.repeat(omax, size)).astype(np.uint8), start)
 
-        if count[ i, j ] > 1:
+            higher = omax > upmax[targets]
+            same = omax == upmax[targets]
+            upcount[ targets[same] ] += k[same]
+            upmax[ targets[higher] ] = omax[higher]
+            upcount[ targets[higher] ] = k[higher]
 
-            out[ i, j ] = out[ i, j ] + 1
+        if out is None:
+            out = np.zeros(flowdir.shape, dtype=np.uint8)
 
-        dx = flowdir[ i, j ]
+    else:
 
-        if dx > 0:
+        order = np.zeros(n, dtype=np.uint32)
+        upsum = np.zeros(n, dtype=np.uint32)
 
-            dx = int(np.log2(dx))
-            ix = i + ci[dx]
-            jx = j + cj[dx]
+        for level in topological_levels(flowdir, down):
 
-            if ingrid(elevations, ix, jx):
+            o = np.where(upsum[level] > 0, upsum[level], 1)
+            order[level] = o
 
-                if out[ i, j ] > out[ ix, jx ]:
+            connected = down[level] >= 0
+            if not np.any(connected):
+                continue
 
-                    out[ ix, jx ] = out[ i, j ]
-                    count[ ix, jx ] = 1
+            targets, o, start = _group_by(down[level][connected], o[connected])
+            upsum[targets] += np.add.reduceat(o, start).astype(np.uint32)
 
-                elif out[ i, j ] == out[ ix, jx ]:
+        if out is None:
+            out = np.zeros(flowdir.shape, dtype=np.uint32)
 
-                    count[ ix, jx ] = count[ i, j ] + 1
+    out[...] = order.reshape(flowdir.shape)
 
     return out
 
-def fillsinks(elevations, nodata, rx, ry, out=None, minslope=1e-3):
+def strahler(elevations, flowdir, nodata, out=None):
+    """
+    Strahler order,
+    assuming connection between cells in the up-down direction
+    given by flowdir.
+
+    Kept for compatibility, see `stream_order`.
+    Elevations are only used to mask no-data cells.
+
+    Parameters
+    ----------
+
+    elevations: array-like
+        Digital elevation model (DEM) raster (ndim=2)
+
+    flowdir: array-like
+        Same shape as elevations
+
+    nodata: float
+        No-data value of elevations
+
+    out: array-like
+        Output raster, dtype uint8,
+        same shape as elevations
+
+    Returns
+    -------
+
+    Strahler order raster, no-data = 0
+    """
+
+    out = stream_order(flowdir, 'strahler', out)
+    out[ elevations == nodata ] = 0
+
+    return out
+
+def fillsinks(elevations, nodata, rx, ry, out=None, minslope=1e-3, step=None):
     """ Fill sinks of digital elevation model (DEM),
-        based on the algorithm of Wang & Liu (2006).
+        based on the algorithm of Wang & Liu (2006),
+        implemented as Barnes' priority-flood + epsilon.
 
     Parameters
     ----------
@@ -271,6 +463,12 @@ def fillsinks(elevations, nodata, rx, ry, out=None, minslope=1e-3):
         Minimum slope to preserve between cells
         when filling up sinks.
 
+    step: float
+        If not None, elevations are assumed to be quantized
+        to multiples of `step`, and cells are queued in buckets of
+        height `step` above the minimum elevation.
+        Otherwise, buckets are the distinct elevation values of the DEM.
+
     Returns
     -------
 
@@ -279,6 +477,17 @@ def fillsinks(elevations, nodata, rx, ry, out=None, minslope=1e-3):
     Notes
     -----
 
+    The priority queue is a bucket queue of flat cell indices,
+    stored as linked lists in preallocated arrays.
+    Cells are only ever queued with their own elevation,
+    cells raised to their spill level going to a plain FIFO queue,
+    so that popping buckets in increasing order
+    processes cells from lower z to higher z.
+
+    When `step` is given and elevations are not multiples of `step`,
+    cells in the same bucket are not ordered,
+    and sinks may be filled up to `step` too high.
+
     [1] Wang, L. & H. Liu (2006)
         An efficient method for identifying and filling surface depressions
         in digital elevation models.
@@ -288,6 +497,11 @@ def fillsinks(elevations, nodata, rx, ry, out=None, minslope=1e-3):
     [2] SAGA C++ Implementation
         https://github.com/saga-gis/saga-gis/blob/1b54363/saga-gis/src/tools/terrain_analysis/ta_preprocessor/FillSinks_WL_XXL.cpp
         GPL Licensed
+
+    [3] Barnes, R., Lehman, C. & D. Mulla (2014)
+        Priority-flood: An optimal depression-filling
+        and watershed-labeling algorithm for digital elevation models.
+        Computers & Geosciences, Vol. 62: 117-127.
     """
 
     height = elevations.shape[0]
@@ -301,61 +515,119 @@ def fillsinks(elevations, nodata, rx, ry, out=None, minslope=1e-3):
 
     progress = TermProgressBar(2*width*height)
     progress.write('Input is %d x %d' % (width, height))
-    
+
     progress.write('Find boundary cells ...')
 
-    # We use a heap queue to sort cells
-    # from lower z to higher z.
-    # Remember python's heapq is a min-heap.
-    queue = list()
+    # Work on flat arrays padded with one no-data cell on each side,
+    # so that neighbors are found by adding a constant offset
+    # and never fall out of the grid.
+
+    pwidth = width + 2
+    offset = [ ci[x]*pwidth + cj[x] for x in range(8) ]
+
+    valid = np.zeros((height+2, pwidth), dtype=np.bool_)
+    valid[ 1:-1, 1:-1 ] = (elevations != nodata)
+
+    boundary = np.zeros_like(valid)
+    for x in range(8):
+        boundary[ 1:-1, 1:-1 ] |= ~valid[ 1+ci[x]:height+1+ci[x], 1+cj[x]:width+1+cj[x] ]
+    boundary &= valid
+
+    dem = np.full((height+2, pwidth), nodata, dtype=elevations.dtype)
+    dem[ 1:-1, 1:-1 ] = elevations
+    dem = dem.reshape(-1)
+    filled = dem.copy()
+
+    closed = ~valid.reshape(-1)
+    cells = np.flatnonzero(valid)
+    seeds = np.flatnonzero(boundary)
+
+    if seeds.size == 0:
+        # no valid cell
+        progress.close()
+        return out
+
+    if step is None:
+        levels, levels_inverse = np.unique(dem[cells], return_inverse=True)
+        level = np.zeros(dem.shape, dtype=np.int64)
+        level[cells] = levels_inverse
+        nlevels = len(levels)
+    else:
+        zmin = np.min(dem[cells]) if len(cells) else 0
+        level = np.zeros(dem.shape, dtype=np.int64)
+        level[cells] = np.floor((dem[cells] - zmin) / step)
+        nlevels = int(np.max(level)) + 1
+
+    # Bucket queue: head[l] is the first cell queued at level l,
+    # and next_cell[c] is the next cell in the same bucket as c.
+
+    head = np.full(nlevels, -1, dtype=np.int64)
+    next_cell = np.full(dem.shape, -1, dtype=np.int64)
+
+    seeds = seeds[ np.argsort(level[seeds], kind='mergesort') ]
+    seed_levels = level[seeds]
+    last = np.append(seed_levels[1:] != seed_levels[:-1], True)
+    next_cell[ seeds[:-1] ] = np.where(last[:-1], -1, seeds[1:])
+    first = np.insert(last[:-1], 0, True)
+    head[ seed_levels[first] ] = seeds[first]
+    closed[seeds] = True
+
+    # FIFO queue of cells raised to their spill level
+
+    pit = np.zeros(len(cells), dtype=np.int64)
+    pit_head = pit_tail = 0
+
+    progress.update(width*height)
+    progress.write('Fill depressions from bottom to top ...')
 
-    for i in range(height):
-        for j in range(width):
+    current = 0
 
-            z = elevations[ i, j ]
-            
-            if z != nodata:
-                
-                for x in range(8):
-                
-                    ix = i + ci[x]
-                    jx = j + cj[x]
-                
-                    if not ingrid(elevations, ix, jx) or (elevations[ ix, jx ] == nodata):
-                        
-                        out[ i, j ] = z
-                        heappush(queue, (z, x, y))
+    while True:
 
-                        break
+        if pit_head < pit_tail:
 
-            progress.update(1)
+            c = pit[pit_head]
+            pit_head += 1
 
-    progress.write('Fill depressions from bottom to top ...')
+        else:
+
+            while current < nlevels and head[current] == -1:
+                current += 1
+
+            if current == nlevels:
+                break
 
-    z, i, j = queue[0]
-    progress.write('Starting from z = %f' % z)
-        
-    while queue:
+            c = head[current]
+            head[current] = next_cell[c]
 
-        z, i, j = heappop(queue)
-        z = out[ i, j ]
+        z = filled[c]
 
         for x in range(8):
-            
-            ix = i + ci[x]
-            jx = j + cj[x]
-            zx = data[ ix, jx ]
-            
-            if ingrid(elevations, ix, jx) and (zx != nodata) and (out[ ix, jx ] == nodata):
 
-                if zx < (z + mindiff[x]):
-                    zx = z + mindiff[x]
+            cx = c + offset[x]
 
-                out[ ix, jx ] = zx
-                heappush(queue, (iz, ix, iy))
+            if closed[cx]:
+                continue
+
+            closed[cx] = True
+            zx = dem[cx]
+
+            if zx < (z + mindiff[x]):
+
+                filled[cx] = z + mindiff[x]
+                pit[pit_tail] = cx
+                pit_tail += 1
+
+            else:
+
+                lx = level[cx]
+                next_cell[cx] = head[lx]
+                head[lx] = cx
 
         progress.update(1)
 
+    out[ valid[ 1:-1, 1:-1 ] ] = filled.reshape(height+2, pwidth)[ 1:-1, 1:-1 ][ valid[ 1:-1, 1:-1 ] ]
+
     progress.write('Done.')
     progress.close()
 
@@ -482,4 +754,357 @@ def watershed(flowdir, i0, j0, watershed_id, out=None):
 
     upslope(flowdir, si, sj, watershed_id, out)
 
-    return out
\ No newline at end of file
+    return out
+
+def watersheds(flowdir, rows, cols, ids, out=None):
+    """ Delineate the water basins of many outlets at once,
+    labelling each cell with the id of the first outlet
+    found downstream of that cell.
+
+    Cells are processed in reverse topological order,
+    from outlets to sources, in one pass over the raster.
+    Cells on a flow direction cycle, which have no such order,
+    are labelled first with the first outlet found along the cycle,
+    as `upslope` would.
+
+    Parameters
+    ----------
+
+    flowdir: array-like, ndim=2, dtype=uint8
+        Flow direction raster
+
+    rows: array-like, dtype=int
+        Row index of outlet cells
+
+    cols: array-like, dtype=int
+        Column index of outlet cells
+
+    ids: array-like, dtype=int
+        Value to assign to cells of `out` found in the basin of each outlet
+
+    out: array-like, ndim=2, dtype=int32
+        Output raster, same shape as `flowdir`.
+        This raster stores the id of the water basin to which each cell belongs.
+        Cells outside of any basin are left unchanged.
+
+    Returns
+    -------
+
+    out: numpy-array, ndim=2, dtype=int32
+        Output raster, having same shape as `flowdir`.
+
+    counts: numpy-array, dtype=int64
+        Size in cells of each outlet basin,
+        in the same order as `ids`.
+    """
+
+    height = flowdir.shape[0]
+    width = flowdir.shape[1]
+    n = height * width
+
+    if out is None:
+        out = np.zeros(flowdir.shape, dtype=np.int32)
+
+    ids = np.asarray(ids)
+
+    # Outlets are labelled with their position in `ids`,
+    # other cells with the label of their downstream cell.
+
+    outlet = np.full(n, -1, dtype=np.int64)
+    outlet[ np.asarray(rows, dtype=np.int64)*width + np.asarray(cols, dtype=np.int64) ] = np.arange(len(ids))
+
+    down = downstream(flowdir)
+    labels = np.full(n, -1, dtype=np.int64)
+    levels = list(topological_levels(flowdir, down))
+
+    # Cells on a flow direction cycle are not in any level :
+    # label them first, walking down the cycle to the first outlet
+
+    on_cycle = (flowdir.reshape(-1) != 0)
+    for level in levels:
+        on_cycle[level] = False
+
+    cycle = np.flatnonzero(on_cycle)
+    labels[cycle] = outlet[cycle]
+    pending = cycle[ labels[cycle] == -1 ]
+
+    while pending.size:
+
+        label = labels[ down[pending] ]
+        found = (label >= 0)
+
+        if not np.any(found):
+            # cycles without outlet
+            break
+
+        labels[ pending[found] ] = label[found]
+        pending = pending[~found]
+
+    for level in reversed(levels):
+
+        label = outlet[level]
+        inherit = (label == -1) & (down[level] >= 0)
+        label[inherit] = labels[ down[level][inherit] ]
+        labels[level] = label
+
+    labelled = labels >= 0
+    out.reshape(-1)[labelled] = ids[ labels[labelled] ]
+    counts = np.bincount(labels[labelled], minlength=len(ids))
+
+    return out, counts
+
+def _accumulate(down, levels, values):
+    """ Add each cell's value to all cells downstream of it,
+    in place, processing cells level by level
+    in the topological order given by `levels`.
+    """
+
+    for level in levels:
+
+        connected = down[level] >= 0
+        if not np.any(connected):
+            continue
+
+        targets, v, start = _group_by(down[level][connected], values[level][connected])
+        values[targets] += np.add.reduceat(v, start).astype(values.dtype)
+
+    return values
+
+def flow_accumulation(flowdir, weights=None, out=None):
+    """ Flow accumulation from D8 flow direction,
+    ie. the number of cells, or the sum of `weights`,
+    upslope of each cell, the cell itself included.
+
+    Cells are processed in topological order,
+    from sources to outlets.
+
+    Parameters
+    ----------
+
+    flowdir: array-like, ndim=2, dtype=uint8
+        D8 flow direction raster, no-data = 0
+
+    weights: array-like, ndim=2
+        Per-cell weight (rainfall, cell area ...),
+        same shape as flowdir,
+        or None to count cells
+
+    out: array-like
+        Output raster, same shape as flowdir,
+        dtype uint32 when counting cells,
+        float64 when summing weights
+
+    Returns
+    -------
+
+    Flow accumulation raster, no-data = 0
+    """
+
+    down = downstream(flowdir)
+    values = _initial_accumulation(flowdir, weights)
+    _accumulate(down, topological_levels(flowdir, down), values)
+
+    if out is None:
+        out = np.zeros(flowdir.shape, dtype=values.dtype)
+
+    out[...] = values.reshape(flowdir.shape)
+
+    return out
+
+def _initial_accumulation(flowdir, weights):
+    """ Own flat value of each cell before accumulation,
+    0 for no-data cells
+    """
+
+    valid = (flowdir.reshape(-1) != 0)
+
+    if weights is None:
+        return valid.astype(np.uint32)
+
+    return np.where(valid, np.asarray(weights, dtype=np.float64).reshape(-1), 0)
+
+def _tile_downstream(flowdir, r0, r1, c0, c1):
+    """ Downstream cells of tile [r0:r1, c0:c1] of flowdir.
+
+    Returns
+    -------
+
+    down: numpy-array
+        Tile flat index of the downstream cell,
+        -1 for cells flowing out of the tile or nowhere
+
+    target: numpy-array
+        Raster flat index of the downstream cell
+        for cells flowing out of the tile, -1 otherwise
+    """
+
+    height = flowdir.shape[0]
+    width = flowdir.shape[1]
+    th = r1 - r0
+    tw = c1 - c0
+
+    # Pad tile with a 1-cell halo of neighbor tiles,
+    # so that downstream() sees flows crossing the tile edge.
+
+    padded = np.zeros((th+2, tw+2), dtype=flowdir.dtype)
+    pr0 = max(r0-1, 0)
+    pr1 = min(r1+1, height)
+    pc0 = max(c0-1, 0)
+    pc1 = min(c1+1, width)
+    padded[ pr0-r0+1:pr1-r0+1, pc0-c0+1:pc1-c0+1 ] = flowdir[ pr0:pr1, pc0:pc1 ]
+
+    down = downstream(padded).reshape(th+2, tw+2)[ 1:-1, 1:-1 ].reshape(-1)
+    i, j = np.divmod(down, tw+2)
+    i -= 1
+    j -= 1
+
+    connected = (down >= 0)
+    inside = connected & (i >= 0) & (i < th) & (j >= 0) & (j < tw)
+    leaving = connected & ~inside
+
+    target = np.where(leaving, (r0 + i)*width + c0 + j, -1)
+    down = np.where(inside, i*tw + j, -1)
+
+    return down, target
+
+def flow_accumulation_tiled(flowdir, weights=None, tile_size=1024, out=None):
+    """ Flow accumulation from D8 flow direction,
+    processing the raster in square tiles,
+    so that temporary arrays scale with tile size.
+    `flowdir`, `weights` and `out` may be memory-mapped arrays.
+
+    A first pass accumulates each tile on its own,
+    and records the partial sums flowing out of the tile edges.
+    These partial sums are carried across tile edges
+    on the small forest of tile exit cells,
+    and a second pass accumulates each tile again,
+    with the inflow from its neighbor tiles.
+
+    Parameters
+    ----------
+
+    See `flow_accumulation`
+
+    tile_size: int
+        Tile width and height in cells
+
+    Returns
+    -------
+
+    Flow accumulation raster, no-data = 0,
+    same as `flow_accumulation`
+    """
+
+    height = flowdir.shape[0]
+    width = flowdir.shape[1]
+    dtype = np.uint32 if weights is None else np.float64
+
+    if out is None:
+        out = np.zeros(flowdir.shape, dtype=dtype)
+
+    tiles = [ (r0, min(r0 + tile_size, height), c0, min(c0 + tile_size, width))
+              for r0 in range(0, height, tile_size)
+              for c0 in range(0, width, tile_size) ]
+
+    def tile_data(r0, r1, c0, c1):
+
+        tile = flowdir[ r0:r1, c0:c1 ]
+        down, target = _tile_downstream(flowdir, r0, r1, c0, c1)
+        values = _initial_accumulation(tile, None if weights is None else weights[ r0:r1, c0:c1 ])
+        levels = list(_levels(down, tile.reshape(-1) != 0))
+
+        return down, target, values, levels
+
+    def global_index(r0, c0, tw, local):
+
+        i, j = np.divmod(local, tw)
+        return (r0 + i)*width + c0 + j
+
+    # First pass: local accumulation, partial sums at tile exits,
+    # and exit cell of each tile perimeter cell
+
+    exit_ids = list()
+    exit_targets = list()
+    exit_values = list()
+    perimeter_ids = list()
+    perimeter_exits = list()
+
+    for r0, r1, c0, c1 in tiles:
+
+        tw = c1 - c0
+        down, target, values, levels = tile_data(r0, r1, c0, c1)
+        _accumulate(down, levels, values)
+
+        exits = np.flatnonzero(target >= 0)
+        exit_ids.append(global_index(r0, c0, tw, exits))
+        exit_targets.append(target[exits])
+        exit_values.append(values[exits])
+
+        exit_of = np.full(down.shape, -1, dtype=np.int64)
+        exit_of[exits] = exit_ids[-1]
+
+        for level in reversed(levels):
+            inherit = (target[level] < 0) & (down[level] >= 0)
+            exit_of[ level[inherit] ] = exit_of[ down[level][inherit] ]
+
+        perimeter = np.zeros((r1 - r0, tw), dtype=np.bool_)
+        perimeter[ [0, -1], : ] = True
+        perimeter[ :, [0, -1] ] = True
+        perimeter = np.flatnonzero(perimeter)
+
+        perimeter_ids.append(global_index(r0, c0, tw, perimeter))
+        perimeter_exits.append(exit_of[perimeter])
+
+    exit_ids = np.concatenate(exit_ids)
+    exit_targets = np.concatenate(exit_targets)
+    exit_values = np.concatenate(exit_values).astype(dtype)
+    perimeter_ids = np.concatenate(perimeter_ids)
+    perimeter_exits = np.concatenate(perimeter_exits)
+
+    # Carry partial sums across tile edges:
+    # each exit flows into a perimeter cell of a neighbor tile,
+    # and from there to the next exit downstream, if any.
+
+    order = np.argsort(perimeter_ids)
+    perimeter_ids = perimeter_ids[order]
+    perimeter_exits = perimeter_exits[order]
+
+    order = np.argsort(exit_ids)
+    exit_ids = exit_ids[order]
+    exit_targets = exit_targets[order]
+    exit_values = exit_values[order]
+
+    next_exit = perimeter_exits[ np.searchsorted(perimeter_ids, exit_targets) ]
+    next_node = np.where(next_exit >= 0, np.searchsorted(exit_ids, next_exit), -1)
+
+    nodes = np.ones(len(exit_ids), dtype=np.bool_)
+    _accumulate(next_node, _levels(next_node, nodes), exit_values)
+
+    # Inflow of each entry cell, grouped by tile
+
+    entries, inflow, start = _group_by(exit_targets, exit_values)
+    if inflow.size:
+        inflow = np.add.reduceat(inflow, start).astype(dtype)
+
+    ntc = (width + tile_size - 1) // tile_size
+    ei, ej = np.divmod(entries, width)
+    entry_tile = (ei // tile_size) * ntc + ej // tile_size
+    order = np.argsort(entry_tile, kind='mergesort')
+    entries = entries[order]
+    inflow = inflow[order]
+    tile_start = np.searchsorted(entry_tile[order], np.arange(len(tiles) + 1))
+
+    # Second pass: accumulate tiles again with their inflow
+
+    for t, (r0, r1, c0, c1) in enumerate(tiles):
+
+        tw = c1 - c0
+        down, target, values, levels = tile_data(r0, r1, c0, c1)
+
+        i, j = np.divmod(entries[ tile_start[t]:tile_start[t+1] ], width)
+        values[ (i - r0)*tw + j - c0 ] += inflow[ tile_start[t]:tile_start[t+1] ]
+
+        _accumulate(down, levels, values)
+        out[ r0:r1, c0:c1 ] = values.reshape(r1 - r0, tw)
+
+    return out
@@ -0,0 +1,201 @@
+# coding: utf-8
+
+# requires common.pxi (parallel_threads, distance_2d, deg2rad)
+# and typedef.pxi (Gradient)
+
+from cython.parallel cimport prange
+
+@cython.cdivision(True)
+cdef inline Gradient window_gradient(float zn, float zs, float zw, float ze, float rx, float ry, float nodata) noexcept nogil:
+    """
+    Same as `local_gradient`,
+    from the already loaded N, S, W and E neighbors of the cell.
+    """
+
+    cdef float dzx, dzy
+    cdef Gradient gradient
+
+    dzx = dzy = 0.0
+    gradient.slope = 0.0
+    gradient.aspect = -1.0
+
+    if zw != nodata and ze != nodata:
+        dzx = (ze - zw) / (2 * rx)
+
+    if zs != nodata and zn != nodata:
+        dzy = (zn - zs) / (2 * ry)
+
+    if not (dzx == 0.0 and dzy == 0.0):
+
+        gradient.slope = sqrt(dzx*dzx + dzy*dzy)
+        gradient.aspect = pi + atan2(dzx, dzy)
+
+    return gradient
+
+@cython.cdivision(True)
+cdef inline float steeper(float z, float zx, double distance, float nodata, float mins) noexcept nogil:
+    """
+    Minimum of `mins` and of the slope from z to neighbor zx,
+    as in `max_slope`
+    """
+
+    cdef float sx
+
+    if zx == nodata:
+        return mins
+
+    sx = (zx - z) / distance
+
+    if sx < mins:
+        return sx
+
+    return mins
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def terrain_derivatives(
+        float[:, :] elevations,
+        float rx,
+        float ry,
+        float nodata,
+        float azimuth=315.0,
+        float declination=45.0,
+        float zscale=1.0,
+        float[:, :] out_slope=None,
+        float[:, :] out_aspect=None,
+        float[:, :] out_hillshade=None,
+        float[:, :] out_max_slope=None,
+        int num_threads=0):
+    """
+    terrain_derivatives(elevations, rx, ry, nodata, azimuth=315, declination=45, zscale=1,
+                        out_slope=None, out_aspect=None, out_hillshade=None, out_max_slope=None,
+                        num_threads=0)
+
+    Compute any subset of slope, aspect, hillshade and max downslope gradient
+    in a single pass over the DEM, reading each 3x3 window once.
+    Outputs are the same as `gradient`, `hillshade` and `max_slope`.
+
+    Parameters
+    ----------
+
+    elevations: array-like, dtype float
+        z values from digital elevation model (DEM),
+        1-pixel padded with nodata with respect to outputs' shape
+
+    rx: float
+        Cell resolution in x direction
+
+    ry: float
+        Cell resolution in x direction
+
+    nodata: float
+        No-data value in the raster elevation input
+
+    azimuth: float
+        Direction of the light source, measured in degree clockwise from the North direction.
+
+    declination: float
+        Height of the light source, measured in degree above the horizon.
+
+    zscale: float
+        Vertical exaggeration applied to slope for hillshading
+
+    out_slope, out_aspect, out_hillshade, out_max_slope: array-like
+        Output rasters, dtype float32, initialized to nodata,
+        or None to skip the corresponding derivative.
+        At least one output must be given.
+
+    num_threads: int
+        Number of threads processing rows in parallel,
+        or 0 to use all available cores
+    """
+
+    cdef long rows, cols
+    cdef long i, j
+    cdef float z, zn, zs, zw, ze, znw, zne, zsw, zse, mins, angle
+    cdef double dx, dy, dxy
+    cdef double[:, :] d2d
+    cdef bint do_slope, do_aspect, do_hillshade, do_max_slope, do_gradient
+    cdef Gradient gradient
+
+    do_slope = out_slope is not None
+    do_aspect = out_aspect is not None
+    do_hillshade = out_hillshade is not None
+    do_max_slope = out_max_slope is not None
+    do_gradient = do_slope or do_aspect or do_hillshade
+
+    if do_slope:
+        rows, cols = out_slope.shape[0], out_slope.shape[1]
+    elif do_aspect:
+        rows, cols = out_aspect.shape[0], out_aspect.shape[1]
+    elif do_hillshade:
+        rows, cols = out_hillshade.shape[0], out_hillshade.shape[1]
+    elif do_max_slope:
+        rows, cols = out_max_slope.shape[0], out_max_slope.shape[1]
+    else:
+        raise ValueError('No output given')
+
+    assert(not do_slope or (out_slope.shape[0] == rows and out_slope.shape[1] == cols))
+    assert(not do_aspect or (out_aspect.shape[0] == rows and out_aspect.shape[1] == cols))
+    assert(not do_hillshade or (out_hillshade.shape[0] == rows and out_hillshade.shape[1] == cols))
+    assert(not do_max_slope or (out_max_slope.shape[0] == rows and out_max_slope.shape[1] == cols))
+
+    d2d = distance_2d(rx, ry)
+    dx = d2d[ 1, 0 ]
+    dy = d2d[ 0, 1 ]
+    dxy = d2d[ 0, 0 ]
+
+    num_threads = parallel_threads(num_threads)
+
+    with nogil:
+
+        azimuth = deg2rad(azimuth)
+        declination = deg2rad(declination)
+
+        for i in prange(rows, num_threads=num_threads, schedule='static'):
+            for j in range(cols):
+
+                z = elevations[ i+1, j+1 ]
+                if z == nodata:
+                    continue
+
+                zn = elevations[ i,   j+1 ]
+                zs = elevations[ i+2, j+1 ]
+                zw = elevations[ i+1, j   ]
+                ze = elevations[ i+1, j+2 ]
+
+                if do_gradient and ingrid3x3(rows, cols, i, j):
+
+                    gradient = window_gradient(zn, zs, zw, ze, rx, ry, nodata)
+
+                    if do_slope:
+                        out_slope[ i, j ] = gradient.slope
+
+                    if do_aspect:
+                        out_aspect[ i, j ] = gradient.aspect
+
+                    if do_hillshade:
+
+                        angle = 0.5*pi - atan(zscale * gradient.slope)
+                        angle = acos( sin(angle)*sin(declination) + cos(angle)*cos(declination)*cos(gradient.aspect - azimuth) )
+                        out_hillshade[ i, j ] = angle
+
+                if do_max_slope:
+
+                    znw = elevations[ i,   j   ]
+                    zne = elevations[ i,   j+2 ]
+                    zsw = elevations[ i+2, j   ]
+                    zse = elevations[ i+2, j+2 ]
+
+                    mins = 0.0
+                    mins = steeper(z, zn, dy, nodata, mins)
+                    mins = steeper(z, zne, dxy, nodata, mins)
+                    mins = steeper(z, ze, dx, nodata, mins)
+                    mins = steeper(z, zse, dxy, nodata, mins)
+                    mins = steeper(z, zs, dy, nodata, mins)
+                    mins = steeper(z, zsw, dxy, nodata, mins)
+                    mins = steeper(z, zw, dx, nodata, mins)
+                    mins = steeper(z, znw, dxy, nodata, mins)
+
+                    out_max_slope[ i, j ] = -mins
@@ -0,0 +1,490 @@
+# coding: utf-8
+""" Out-of-core depression filling of DEM rasters larger than memory,
+    processed by tiles read and written through windowed raster I/O.
+"""
+
+import numpy as np
+from heapq import heappop, heappush
+import rasterio as rio
+from concurrent.futures import ProcessPoolExecutor
+
+from algs import ci, cj
+from windowed import HaloReader, tile_windows
+
+# Label of cells draining out of the DEM,
+# ie. cells next to no-data or to the edge of the raster
+
+OCEAN = 1
+
+def flood_tile(elevations, nodata):
+    """ Priority-flood of a single tile,
+    seeded from the tile perimeter and from cells draining out of the DEM,
+    labelling each cell with the seed it was flooded from.
+
+    Parameters
+    ----------
+
+    elevations: array-like, ndim=2
+        Tile elevations, 1-pixel padded with the neighbor tiles' cells
+
+    nodata: float
+        No-data value in elevations
+
+    Returns
+    -------
+
+    filled: numpy-array
+        Tile elevations filled up to their spill level
+        toward the tile perimeter, unpadded
+
+    labels: numpy-array, dtype=int32
+        Seed label of each cell, unpadded.
+        Label 1 is the outside of the DEM, no-data cells have label -1.
+
+    graph: dict
+        (label a, label b) -> lowest spill elevation between a and b,
+        with a < b
+    """
+
+    height = elevations.shape[0] - 2
+    width = elevations.shape[1] - 2
+    pwidth = width + 2
+    offset = [ ci[x]*pwidth + cj[x] for x in range(8) ]
+
+    valid = (elevations != nodata)
+    inner = np.zeros_like(valid)
+    inner[ 1:-1, 1:-1 ] = valid[ 1:-1, 1:-1 ]
+
+    if not np.any(inner):
+        # no valid cell, eg. outside of a basin mask or over sea
+        filled = elevations[ 1:-1, 1:-1 ].copy()
+        labels = np.full(filled.shape, -1, dtype=np.int32)
+        return filled, labels, dict()
+
+    ocean = np.zeros_like(valid)
+    for x in range(8):
+        ocean[ 1:-1, 1:-1 ] |= ~valid[ 1+ci[x]:height+1+ci[x], 1+cj[x]:width+1+cj[x] ]
+    ocean &= inner
+
+    perimeter = np.zeros_like(valid)
+    perimeter[ 1:-1, 1:-1 ] = True
+    perimeter[ 2:-2, 2:-2 ] = False
+    perimeter &= inner
+
+    dem = elevations.reshape(-1)
+    filled = dem.copy()
+    closed = ~inner.reshape(-1)
+    labels = np.full(dem.shape, -1, dtype=np.int32)
+    labels[ inner.reshape(-1) ] = 0
+    labels[ ocean.reshape(-1) ] = OCEAN
+
+    cells = np.flatnonzero(inner)
+    levels, levels_inverse = np.unique(dem[cells], return_inverse=True)
+    level = np.zeros(dem.shape, dtype=np.int64)
+    level[cells] = levels_inverse
+    nlevels = len(levels)
+
+    head = np.full(nlevels, -1, dtype=np.int64)
+    next_cell = np.full(dem.shape, -1, dtype=np.int64)
+
+    seeds = np.flatnonzero((perimeter | ocean).reshape(-1))
+    seeds = seeds[ np.argsort(level[seeds], kind='mergesort') ]
+    seed_levels = level[seeds]
+    last = np.append(seed_levels[1:] != seed_levels[:-1], True)
+    next_cell[ seeds[:-1] ] = np.where(last[:-1], -1, seeds[1:])
+    first = np.insert(last[:-1], 0, True)
+    head[ seed_levels[first] ] = seeds[first]
+    closed[seeds] = True
+
+    pit = np.zeros(len(cells), dtype=np.int64)
+    pit_head = pit_tail = 0
+
+    graph = dict()
+    next_label = OCEAN + 1
+    current = 0
+
+    while True:
+
+        if pit_head < pit_tail:
+
+            c = pit[pit_head]
+            pit_head += 1
+
+        else:
+
+            while current < nlevels and head[current] == -1:
+                current += 1
+
+            if current == nlevels:
+                break
+
+            c = head[current]
+            head[current] = next_cell[c]
+
+        label = labels[c]
+        if label == 0:
+            label = labels[c] = next_label
+            next_label += 1
+
+        z = filled[c]
+
+        for x in range(8):
+
+            cx = c + offset[x]
+            labelx = labels[cx]
+
+            if closed[cx]:
+
+                if labelx == 0:
+                    # perimeter cell still waiting in the queue
+                    labels[cx] = label
+
+                elif labelx > 0 and labelx != label:
+
+                    edge = (label, labelx) if label < labelx else (labelx, label)
+                    spill = max(z, filled[cx])
+                    if spill < graph.get(edge, np.inf):
+                        graph[edge] = spill
+
+                continue
+
+            closed[cx] = True
+            labels[cx] = label
+
+            if dem[cx] <= z:
+
+                filled[cx] = z
+                pit[pit_tail] = cx
+                pit_tail += 1
+
+            else:
+
+                lx = level[cx]
+                next_cell[cx] = head[lx]
+                head[lx] = cx
+
+    filled = filled.reshape(height+2, pwidth)[ 1:-1, 1:-1 ]
+    labels = labels.reshape(height+2, pwidth)[ 1:-1, 1:-1 ]
+
+    return filled, labels, graph
+
+def _label_tile(args):
+    """ First pass worker:
+    flood one tile and return its perimeter and spill-over graph.
+    """
+
+    path, window, nodata = args
+    with HaloReader(path, nodata=nodata) as reader:
+        elevations = reader.read(window)
+    filled, labels, graph = flood_tile(elevations, nodata)
+    nlabels = max(OCEAN, np.max(labels)) if labels.size else OCEAN
+
+    perimeter = {
+        'top': (labels[ 0, : ].copy(), filled[ 0, : ].copy()),
+        'bottom': (labels[ -1, : ].copy(), filled[ -1, : ].copy()),
+        'left': (labels[ :, 0 ].copy(), filled[ :, 0 ].copy()),
+        'right': (labels[ :, -1 ].copy(), filled[ :, -1 ].copy())
+    }
+
+    return perimeter, graph, nlabels
+
+def _fill_tile(args):
+    """ Second pass worker:
+    flood one tile again and raise each cell
+    to the global spill level of its label.
+    """
+
+    path, window, nodata, spill = args
+    with HaloReader(path, nodata=nodata) as reader:
+        elevations = reader.read(window)
+    filled, labels, _ = flood_tile(elevations, nodata)
+
+    valid = (labels > 0)
+    filled[ valid ] = np.maximum(filled[ valid ], spill[ labels[valid] ])
+
+    return filled
+
+def _map(func, tasks, processes):
+    """ Apply func to tasks in order,
+    either in this process or in a pool of worker processes,
+    keeping at most 2 results per worker in memory.
+    """
+
+    if processes <= 1:
+
+        for task in tasks:
+            yield func(task)
+
+    else:
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+
+            pending = list()
+
+            for task in tasks:
+
+                pending.append(executor.submit(func, task))
+
+                if len(pending) >= 2*processes:
+                    yield pending.pop(0).result()
+
+            for future in pending:
+                yield future.result()
+
+def _seam_edges(a, b, offsets, edges):
+    """ Collect spill-over edges between two facing tile sides,
+    given as (labels, elevations, node id base),
+    cell k of side `a` being adjacent to cells k+d of side `b`
+    for every d in `offsets`.
+    """
+
+    labels_a, z_a, base_a = a
+    labels_b, z_b, base_b = b
+
+    for d in offsets:
+
+        ka = np.arange(max(0, -d), min(len(labels_a), len(labels_b) - d))
+        kb = ka + d
+
+        la = labels_a[ka]
+        lb = labels_b[kb]
+        connected = (la > 0) & (lb > 0)
+
+        edges.append((
+            node_ids(la[connected], base_a),
+            node_ids(lb[connected], base_b),
+            np.maximum(z_a[ka][connected], z_b[kb][connected])
+        ))
+
+def node_ids(labels, base):
+    """ Global spill-over graph node id of tile labels,
+    all tiles sharing node 0 for the outside of the DEM.
+    """
+
+    return np.where(labels == OCEAN, 0, base + labels - OCEAN - 1)
+
+def solve_spillover(nodes, u, v, spill):
+    """ Lowest level at which each node of the spill-over graph
+    drains out of the DEM, computed by a priority-flood of the graph
+    starting from node 0.
+
+    Parameters
+    ----------
+
+    nodes: int
+        Number of nodes in graph
+
+    u, v: array-like, dtype=int
+        Edge end nodes
+
+    spill: array-like
+        Edge spill elevation
+
+    Returns
+    -------
+
+    Array of node spill levels, -inf for node 0
+    and for nodes not connected to node 0.
+    """
+
+    # Keep only the lowest edge between each pair of nodes,
+    # then index edges by node in both directions.
+
+    a = np.minimum(u, v)
+    b = np.maximum(u, v)
+    keep = (a != b)
+    a, b, spill = a[keep], b[keep], spill[keep]
+
+    order = np.lexsort((spill, b, a))
+    a, b, spill = a[order], b[order], spill[order]
+    first = np.ones(len(a), dtype=np.bool_)
+    first[1:] = (a[1:] != a[:-1]) | (b[1:] != b[:-1])
+    a, b, spill = a[first], b[first], spill[first]
+
+    source = np.concatenate([ a, b ])
+    target = np.concatenate([ b, a ])
+    weight = np.concatenate([ spill, spill ])
+    order = np.argsort(source, kind='mergesort')
+    target = target[order].tolist()
+    weight = weight[order].tolist()
+    offsets = np.searchsorted(source[order], np.arange(nodes+1)).tolist()
+
+    level = np.full(nodes, np.inf)
+    level[0] = -np.inf
+    done = np.zeros(nodes, dtype=np.bool_)
+    queue = [ (-np.inf, 0) ]
+
+    while queue:
+
+        z, node = heappop(queue)
+
+        if done[node]:
+            continue
+
+        done[node] = True
+
+        for k in range(offsets[node], offsets[node+1]):
+
+            other = target[k]
+            zx = max(z, weight[k])
+
+            if not done[other] and zx < level[other]:
+                level[other] = zx
+                heappush(queue, (zx, other))
+
+    level[ ~done ] = -np.inf
+
+    return level
+
+def fillsinks_tiled(src_path, dst_path, tile_size=1024, nodata=None, processes=1):
+    """ Fill sinks of a DEM raster tile by tile,
+        based on the parallel priority-flood algorithm of Barnes (2016).
+
+    Each tile is flooded on its own from its perimeter,
+    labelling cells by the perimeter cell they were flooded from.
+    The spill-over graph between labels, within and across tiles,
+    is then solved globally, and a second pass over the tiles
+    raises each cell to the spill level of its label.
+
+    Memory scales with tile size and with the total length
+    of tile perimeters, not with DEM size.
+
+    Parameters
+    ----------
+
+    src_path: str
+        Input DEM raster, band 1
+
+    dst_path: str
+        Output filled DEM raster,
+        created with the same profile as the input
+
+    tile_size: int
+        Tile width and height in cells
+
+    nodata: float
+        No-data value in the input,
+        defaults to the input raster no-data value,
+        or to the lowest value of the input data type
+        if the input has no no-data value
+
+    processes: int
+        Number of worker processes used to flood tiles
+
+    Returns
+    -------
+
+    dst_path
+
+    Notes
+    -----
+
+    Depressions are filled flat, as with `fillsinks(..., minslope=0)`;
+    flats are left for the flow direction step to resolve.
+
+    [1] Barnes, R. (2016)
+        Parallel priority-flood depression filling
+        for trillion cell digital elevation models on desktops or clusters.
+        Computers & Geosciences, Vol. 96: 56-68.
+    """
+
+    with rio.open(src_path) as src:
+
+        profile = src.profile.copy()
+        height = src.height
+        width = src.width
+
+        if nodata is None:
+            nodata = src.nodata
+
+        if nodata is None:
+            # no no-data cells: use a value out of the range of elevations
+            dtype = np.dtype(src.dtypes[0])
+            if np.issubdtype(dtype, np.integer):
+                nodata = np.iinfo(dtype).min
+            else:
+                nodata = np.finfo(dtype).min
+
+    windows = tile_windows(height, width, tile_size)
+    flat_windows = [ window for row in windows for window in row ]
+
+    # First pass: flood tiles, collect perimeters and local graphs
+
+    perimeters = list()
+    edges = list()
+    bases = list()
+    counts = list()
+    nodes = 1
+
+    tasks = ((src_path, window, nodata) for window in flat_windows)
+
+    for perimeter, graph, nlabels in _map(_label_tile, tasks, processes):
+
+        perimeters.append(perimeter)
+        bases.append(nodes)
+        counts.append(nlabels - OCEAN)
+
+        if graph:
+            pairs = np.array(list(graph.keys()), dtype=np.int64)
+            edges.append((
+                node_ids(pairs[:, 0], nodes),
+                node_ids(pairs[:, 1], nodes),
+                np.array(list(graph.values()))
+            ))
+
+        nodes += counts[-1]
+
+    # Connect tiles along seams and corners
+
+    rows = len(windows)
+    cols = len(windows[0])
+
+    def side(r, c, name):
+        labels, z = perimeters[r*cols + c][name]
+        return labels, z, bases[r*cols + c]
+
+    def corner(r, c, name, k):
+        labels, z = perimeters[r*cols + c][name]
+        k = k % len(labels)
+        return labels[ k:k+1 ], z[ k:k+1 ], bases[r*cols + c]
+
+    for r in range(rows):
+        for c in range(cols):
+
+            if c+1 < cols:
+                _seam_edges(side(r, c, 'right'), side(r, c+1, 'left'), (-1, 0, 1), edges)
+
+            if r+1 < rows:
+                _seam_edges(side(r, c, 'bottom'), side(r+1, c, 'top'), (-1, 0, 1), edges)
+
+            if r+1 < rows and c+1 < cols:
+                _seam_edges(corner(r, c, 'bottom', -1), corner(r+1, c+1, 'top', 0), (0,), edges)
+
+            if r+1 < rows and c > 0:
+                _seam_edges(corner(r, c, 'bottom', 0), corner(r+1, c-1, 'top', -1), (0,), edges)
+
+    if edges:
+        u, v, spill = (np.concatenate(e) for e in zip(*edges))
+    else:
+        u = v = np.zeros(0, dtype=np.int64)
+        spill = np.zeros(0)
+
+    level = solve_spillover(nodes, u, v, spill)
+
+    # Second pass: raise tiles to their global spill levels
+
+    def fill_tasks():
+
+        for t, window in enumerate(flat_windows):
+
+            spill = np.full(counts[t] + OCEAN + 1, -np.inf)
+            spill[ OCEAN+1: ] = level[ bases[t]:bases[t] + counts[t] ]
+
+            yield (src_path, window, nodata, spill)
+
+    with rio.open(dst_path, 'w', **profile) as dst:
+
+        for window, filled in zip(flat_windows, _map(_fill_tile, fill_tasks(), processes)):
+            dst.write(filled.astype(profile['dtype']), 1, window=window)
+
+    return dst_path
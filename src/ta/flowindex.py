@@ -0,0 +1,136 @@
+# coding: utf-8
+""" Euler tour index of the D8 flow forest,
+    for constant-time upstream queries against a fixed flow direction raster.
+"""
+
+import numpy as np
+
+from algs import downstream, topological_levels, _accumulate
+
+class FlowIndex(object):
+    """ DFS pre-order interval of every cell of the flow forest,
+    walking from outlets to sources.
+
+    The cells upstream of a cell x, x included,
+    are exactly the cells y such that
+
+        preorder[x] <= preorder[y] < preorder[x] + size[x]
+
+    and the post-order rank of x is preorder[x] + size[x] - 1.
+
+    Parameters
+    ----------
+
+    preorder: array-like, ndim=2, dtype=int32 or int64
+        DFS pre-order rank of each cell, -1 for no-data cells,
+        for cells on a flow direction cycle
+        and for cells draining to a cycle
+
+    size: array-like, ndim=2, same dtype as preorder
+        Number of cells upstream of each cell, itself included,
+        0 for cells not indexed
+    """
+
+    def __init__(self, preorder, size):
+
+        self.preorder = preorder
+        self.size = size
+
+    @classmethod
+    def build(cls, flowdir):
+        """ Build the index of flow direction raster `flowdir`,
+        with the D8 codes of `ta.algs.flowdir`, no-data = 0.
+        """
+
+        n = flowdir.shape[0] * flowdir.shape[1]
+        dtype = np.int32 if n < 2**31 else np.int64
+
+        down = downstream(flowdir)
+        levels = list(topological_levels(flowdir, down))
+
+        cells = np.concatenate(levels) if levels else np.zeros(0, dtype=np.int64)
+
+        # Upslope size, from sources to outlets
+
+        size = np.zeros(n, dtype=dtype)
+        size[cells] = 1
+        _accumulate(down, levels, size)
+
+        # Offset of each cell's subtree among its siblings,
+        # siblings being visited in flat index order
+
+        cells = np.sort(cells)
+        parents = down[cells]
+
+        order = np.argsort(parents, kind='mergesort')
+        cells = cells[order]
+        parents = parents[order]
+        sizes = size[cells].astype(np.int64)
+
+        before = np.cumsum(sizes) - sizes
+        first = np.concatenate([ [ True ], parents[1:] != parents[:-1] ])
+        group_start = np.maximum.accumulate(np.where(first, np.arange(len(cells)), 0))
+        offset = np.zeros(n, dtype=np.int64)
+        offset[cells] = before - before[group_start]
+
+        # Pre-order rank, from outlets to sources ;
+        # cells draining to a flow direction cycle are not indexed
+
+        preorder = np.full(n, -1, dtype=dtype)
+
+        for level in reversed(levels):
+
+            parent = down[level]
+            root = (parent < 0)
+            rank = offset[level]
+            parent_rank = preorder[ parent[~root] ]
+            rank[~root] = np.where(parent_rank >= 0, rank[~root] + parent_rank + 1, -1)
+            preorder[level] = rank
+
+        size[ preorder < 0 ] = 0
+
+        return cls(preorder.reshape(flowdir.shape), size.reshape(flowdir.shape))
+
+    def is_upstream(self, i, j, io, jo):
+        """ Test if cell (i, j) is upstream of,
+        or the same as, cell (io, jo).
+
+        Accepts scalar or array coordinates.
+        """
+
+        p = self.preorder[ i, j ]
+        po = self.preorder[ io, jo ]
+
+        return (po >= 0) & (p >= po) & (p < po + self.size[ io, jo ])
+
+    def upslope_count(self, i, j):
+        """ Size in cells of the basin upslope of cell (i, j),
+        like `ta.algs.upslope`.
+        """
+
+        return self.size[ i, j ]
+
+    def upslope_mask(self, i, j):
+        """ Boolean raster of cells in the basin upslope of cell (i, j).
+        """
+
+        p = self.preorder[ i, j ]
+
+        if p < 0:
+            return np.zeros(self.preorder.shape, dtype=np.bool_)
+
+        return (self.preorder >= p) & (self.preorder < p + self.size[ i, j ])
+
+    def save(self, filename):
+        """ Store index arrays to a .npz file
+        """
+
+        np.savez(filename, preorder=self.preorder, size=self.size)
+
+    @classmethod
+    def load(cls, filename):
+        """ Load index from a .npz file written by `save`
+        """
+
+        data = np.load(filename)
+        return cls(data['preorder'], data['size'])
@@ -1,7 +1,10 @@
 # coding: utf-8
 
+from cython.parallel cimport prange
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
+@cython.cdivision(True)
 def hillshade(
         float[:,:] elevations,
         float rx,
@@ -10,9 +13,10 @@ def hillshade(
         float azimuth,
         float declination,
         float zscale,
-        float[:,:] out):
+        float[:,:] out,
+        int num_threads=0):
     """
-    hillshade(elevations, nodata, rx, ry, azimuth, declination, zscale, out)
+    hillshade(elevations, nodata, rx, ry, azimuth, declination, zscale, out, num_threads=0)
 
     Parameters
     ----------
@@ -38,6 +42,10 @@ def hillshade(
 
     out: array-like
         Output raster, dtype uint8, initialized to nodata
+
+    num_threads: int
+        Number of threads processing rows in parallel,
+        or 0 to use all available cores
     """
 
     cdef long rows, cols
@@ -45,6 +53,8 @@ def hillshade(
     cdef float z, angle
     cdef Gradient gradient
 
+    num_threads = parallel_threads(num_threads)
+
     with nogil:
 
         rows = out.shape[0]
@@ -53,7 +63,7 @@ def hillshade(
         azimuth = deg2rad(azimuth)
         declination = deg2rad(declination)
 
-        for i in range(rows):
+        for i in prange(rows, num_threads=num_threads, schedule='static'):
             for j in range(cols):
 
                 if not ingrid3x3(rows, cols, i, j):
@@ -1,15 +1,19 @@
 # coding: utf-8
 
+from cython.parallel cimport prange
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
+@cython.cdivision(True)
 def max_slope(
         float[:, :] elevations,
         float[:, :] out,
         float rx,
         float ry,
-        float nodata):
+        float nodata,
+        int num_threads=0):
     """
-    max_slope(elevations, rx, ry, nodata, out)
+    max_slope(elevations, out, rx, ry, nodata, num_threads=0)
 
     Parameters
     ----------
@@ -30,6 +34,10 @@ def max_slope(
     out: array-like
         Output raster, dtype uint8, initialized to nodata
 
+    num_threads: int
+        Number of threads processing rows in parallel,
+        or 0 to use all available cores
+
     """
 
     cdef long rows, cols
@@ -42,10 +50,11 @@ def max_slope(
     cols = out.shape[1]
 
     d2d = distance_2d(rx, ry)
+    num_threads = parallel_threads(num_threads)
 
     with nogil:
 
-        for i in range(rows):
+        for i in prange(rows, num_threads=num_threads, schedule='static'):
             for j in range(cols):
 
                 z = elevations[i+1, j+1]
@@ -74,7 +83,8 @@ def max_slope(
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cdef Gradient local_gradient(float[:, :] elevations, float rx, float ry, float nodata, long i, long j) nogil:
+@cython.cdivision(True)
+cdef Gradient local_gradient(float[:, :] elevations, float rx, float ry, float nodata, long i, long j) noexcept nogil:
 
     cdef float dzx, dzy, r1, r0
     cdef Gradient gradient
@@ -113,15 +123,17 @@ cdef Gradient local_gradient(float[:, :] elevations, float rx, float ry, float n
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
+@cython.cdivision(True)
 def gradient(
         float[:, :] elevations,
         float rx,
         float ry,
         float nodata,
         float[:, :] out_slope,
-        float[:, :] out_aspect):
+        float[:, :] out_aspect,
+        int num_threads=0):
     """
-    gradient(elevations, rx, ry, nodata, out)
+    gradient(elevations, rx, ry, nodata, out_slope, out_aspect, num_threads=0)
 
     Parameters
     ----------
@@ -142,6 +154,10 @@ def gradient(
     out: array-like
         Output raster, dtype uint8, initialized to nodata
 
+    num_threads: int
+        Number of threads processing rows in parallel,
+        or 0 to use all available cores
+
     """
 
     cdef long rows, cols
@@ -151,13 +167,14 @@ def gradient(
     cdef Gradient gradient
 
     assert(out_slope.shape[0] == out_aspect.shape[0] and out_slope.shape[1] == out_aspect.shape[1])
+    num_threads = parallel_threads(num_threads)
 
     with nogil:
 
         rows = out_slope.shape[0]
         cols = out_slope.shape[1]
 
-        for i in range(rows):
+        for i in prange(rows, num_threads=num_threads, schedule='static'):
             for j in range(cols):
 
                 if not ingrid3x3(rows, cols, i, j):
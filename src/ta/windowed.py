@@ -0,0 +1,271 @@
+# coding: utf-8
+""" Windowed raster I/O for the terrain analysis kernels,
+    which expect input tiles padded by a halo of neighbor cells.
+
+    Tiles are read straight from disk, memory-mapped when the raster
+    is stored uncompressed and contiguous, and results are written
+    back window by window, so that no full padded copy of the raster
+    is ever held in memory.
+"""
+
+import numpy as np
+import rasterio as rio
+from rasterio.windows import Window
+
+def tile_windows(height, width, tile_size):
+    """ Split a raster of shape (height, width)
+    into a grid of square tiles.
+
+    Returns
+    -------
+
+    List of rows of rasterio windows,
+    the last tile of each row or column possibly being smaller.
+    """
+
+    return [
+        [ Window(col, row, min(tile_size, width - col), min(tile_size, height - row))
+          for col in range(0, width, tile_size) ]
+        for row in range(0, height, tile_size)
+    ]
+
+def memmap_band(dataset, band=1):
+    """ Memory-map band `band` of an open rasterio dataset,
+    if it is stored uncompressed and contiguous on disk.
+
+    Supported layouts are ENVI files with band interleaving,
+    and single-band, stripped, uncompressed GeoTIFF files,
+    little- or big-endian,
+    whose strips follow each other.
+
+    Returns
+    -------
+
+    Read-only numpy memmap of shape (height, width),
+    or None if the band cannot be memory-mapped.
+    """
+
+    height = dataset.height
+    width = dataset.width
+    dtype = np.dtype(dataset.dtypes[band-1])
+    band_bytes = height * width * dtype.itemsize
+
+    if dataset.driver == 'ENVI':
+
+        structure = dataset.tags(ns='IMAGE_STRUCTURE')
+        if dataset.count > 1 and structure.get('INTERLEAVE', 'BAND') != 'BAND':
+            return None
+
+        envi = dataset.tags(ns='ENVI')
+        offset = int(envi.get('header_offset', 0)) + (band-1) * band_bytes
+        byteorder = '>' if envi.get('byte_order', '0') == '1' else '<'
+
+        return np.memmap(dataset.name, dtype=dtype.newbyteorder(byteorder),
+                         mode='r', offset=offset, shape=(height, width))
+
+    if dataset.driver == 'GTiff':
+
+        if dataset.count > 1 or dataset.compression is not None:
+            return None
+
+        block_height, block_width = dataset.block_shapes[band-1]
+        if block_width != width:
+            # tiled layout
+            return None
+
+        nblocks = (height + block_height - 1) // block_height
+        block_bytes = block_height * width * dtype.itemsize
+        offsets = list()
+
+        try:
+            for k in range(nblocks):
+                offsets.append(dataset.get_tag_item('BLOCK_OFFSET_0_%d' % k, 'TIFF', bidx=band))
+        except AttributeError:
+            # rasterio without access to GDAL TIFF metadata
+            return None
+
+        if any(offset is None for offset in offsets):
+            return None
+
+        offsets = [ int(offset) for offset in offsets ]
+        first = offsets[0]
+
+        if any(offset != first + k * block_bytes for k, offset in enumerate(offsets)):
+            # strips out of order or not contiguous
+            return None
+
+        # TIFF header: 'II' for little-endian, 'MM' for big-endian
+
+        with open(dataset.name, 'rb') as fp:
+            header = fp.read(2)
+
+        if header == b'II':
+            byteorder = '<'
+        elif header == b'MM':
+            byteorder = '>'
+        else:
+            return None
+
+        return np.memmap(dataset.name, dtype=dtype.newbyteorder(byteorder),
+                         mode='r', offset=first, shape=(height, width))
+
+    return None
+
+class HaloReader(object):
+    """ Read tiles of one raster band,
+    padded with `halo` pixels of neighbor cells on each side,
+    or nodata beyond the edge of the raster.
+
+    Parameters
+    ----------
+
+    path: str
+        Raster file
+
+    band: int
+        Band index, starting from 1
+
+    halo: int
+        Padding width, in pixels
+
+    nodata: float
+        Padding value beyond the edge of the raster,
+        defaults to the raster no-data value
+
+    mmap: bool
+        Read tiles from a memory map of the band when possible,
+        see `memmap_band`
+    """
+
+    def __init__(self, path, band=1, halo=1, nodata=None, mmap=True):
+
+        self.dataset = rio.open(path)
+        self.band = band
+        self.halo = halo
+        self.nodata = self.dataset.nodata if nodata is None else nodata
+        self.array = memmap_band(self.dataset, band) if mmap else None
+
+    @property
+    def height(self):
+        return self.dataset.height
+
+    @property
+    def width(self):
+        return self.dataset.width
+
+    @property
+    def profile(self):
+        return self.dataset.profile
+
+    def read(self, window):
+        """ Read `window` padded with the halo.
+
+        Returns
+        -------
+
+        Array of shape (window.height + 2*halo, window.width + 2*halo)
+        """
+
+        halo = self.halo
+        padded = Window(
+            window.col_off - halo,
+            window.row_off - halo,
+            window.width + 2*halo,
+            window.height + 2*halo)
+
+        row0 = max(0, padded.row_off)
+        row1 = min(self.height, padded.row_off + padded.height)
+        col0 = max(0, padded.col_off)
+        col1 = min(self.width, padded.col_off + padded.width)
+
+        if self.array is None:
+            data = self.dataset.read(self.band, window=Window(col0, row0, col1 - col0, row1 - row0))
+        else:
+            data = self.array[ row0:row1, col0:col1 ]
+
+        out = np.full((padded.height, padded.width), self.nodata, dtype=data.dtype.newbyteorder('='))
+        out[ row0-padded.row_off:row1-padded.row_off, col0-padded.col_off:col1-padded.col_off ] = data
+
+        return out
+
+    def tiles(self, tile_size=1024):
+        """ Iterate over square tiles of the band,
+        in row order.
+
+        Returns
+        -------
+
+        Generator of (window, padded tile) tuples.
+        """
+
+        for row in tile_windows(self.height, self.width, tile_size):
+            for window in row:
+                yield window, self.read(window)
+
+    def close(self):
+
+        self.array = None
+        self.dataset.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def process_tiles(src_path, dst_path, kernel, tile_size=1024, halo=1, dtype='float32', nodata=None, mmap=True):
+    """ Stream a raster band through a kernel, tile by tile,
+    writing each result window back to disk as soon as it is computed.
+
+    Parameters
+    ----------
+
+    src_path: str
+        Input raster, band 1
+
+    dst_path: str
+        Output raster, created with the input profile,
+        and with the given `dtype` and `nodata`
+
+    kernel: callable
+        kernel(elevations, out)
+        where elevations is the input tile padded by `halo` pixels,
+        and out is the output tile, initialized to nodata,
+        eg. `lambda elevations, out: hillshade(elevations, rx, ry, nodata, 315, 45, 1, out)`
+
+    tile_size: int
+        Tile width and height in cells
+
+    halo: int
+        Padding width, in pixels
+
+    dtype: str
+        Output data type
+
+    nodata: float
+        Input and output no-data value,
+        defaults to the input raster no-data value
+
+    mmap: bool
+        Read tiles from a memory map of the input when possible
+
+    Returns
+    -------
+
+    dst_path
+    """
+
+    with HaloReader(src_path, halo=halo, nodata=nodata, mmap=mmap) as reader:
+
+        profile = reader.profile.copy()
+        profile.update(dtype=dtype, nodata=reader.nodata, count=1)
+
+        with rio.open(dst_path, 'w', **profile) as dst:
+
+            for window, elevations in reader.tiles(tile_size):
+
+                out = np.full((window.height, window.width), reader.nodata, dtype=dtype)
+                kernel(elevations, out)
+                dst.write(out, 1, window=window)
+
+    return dst_path
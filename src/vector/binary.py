@@ -0,0 +1,300 @@
+# coding: utf-8
+""" Compact binary container for TopoJSON,
+    loaded by memory-mapping its arrays.
+
+    File layout, all integers little-endian :
+
+    - magic bytes 'TOPOBIN1' ;
+
+    - header length h, uint64 ;
+
+    - header, h bytes of UTF-8 JSON, padded with spaces
+      to a multiple of 8 bytes. The header holds the TopoJSON object
+      without its arcs ('type', 'bbox', 'transform' and 'objects'),
+      where each line or ring of arc references in 'objects'
+      is replaced by its index in `ref_offsets`, and an 'arrays' field
+      giving the 'offset' in file, 'dtype' and 'shape' of each array ;
+
+    - arrays, each starting on a multiple of 8 bytes :
+
+        deltas: int32 (float64 if not quantized), shape (m, 2)
+            Delta-encoded vertices of all arcs, one arc after the other,
+            the first vertex of each arc being absolute
+
+        arc_offsets: int64, shape (arcs + 1,)
+            Start of each arc in deltas, followed by m
+
+        refs: int32, shape (r,)
+            Arc references of all lines and rings, one after the other,
+            i + 1 for arc i, or -(i + 1) for arc i reversed
+
+        ref_offsets: int64, shape (lines + 1,)
+            Start of each line or ring in refs, followed by r
+
+    - for each R-tree of the 'index' member, if any,
+      see `packed_rtree.spatial_index`, named 'arcs' or 'objects' :
+
+        <name>_boxes: float64, shape (nodes, 4)
+
+        <name>_indices: int64, shape (n,)
+
+      the header 'index' member giving the 'node_size' of each tree.
+"""
+
+import numpy as np
+import json
+
+from topology import map_arcs, unpack_objects, decode_arcs, lazy_objects, LazyArcs
+from packed_rtree import PackedRTree, object_members, unpack_members
+
+MAGIC = b'TOPOBIN1'
+ALIGNMENT = 8
+
+def _aligned(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+class PackedTopology(object):
+    """
+    TopoJSON object stored as flat arrays.
+
+    Parameters
+    ----------
+
+    header: dict-like
+        TopoJSON object without arcs,
+        with line and ring indexes in place of arc references,
+        see module documentation
+
+    deltas, arc_offsets, refs, ref_offsets: numpy-array
+        see module documentation
+
+    trees: dict-like
+        `packed_rtree.PackedRTree` by name, see module documentation
+    """
+
+    def __init__(self, header, deltas, arc_offsets, refs, ref_offsets, trees=None):
+
+        self.header = header
+        self.deltas = deltas
+        self.arc_offsets = arc_offsets
+        self.refs = refs
+        self.ref_offsets = ref_offsets
+        self.trees = trees or dict()
+        self.members = object_members(header['objects'])
+
+    @classmethod
+    def from_topojson(cls, topojson):
+        """ Pack a TopoJSON object, see `topology.topology`
+        """
+
+        header = { key: value for key, value in topojson.items() if key not in ('arcs', 'index') }
+        header['objects'] = json.loads(json.dumps(topojson['objects']))
+
+        trees = { name: PackedRTree.from_json(tree) for name, tree in topojson.get('index', {}).items() }
+        if trees:
+            header['index'] = { name: { 'node_size': tree.node_size } for name, tree in trees.items() }
+
+        arcs = topojson['arcs']
+        dtype = np.int32 if topojson.has_key('transform') else np.float64
+        lengths = [ len(arc) for arc in arcs ]
+        arc_offsets = np.concatenate([ [ 0 ], np.cumsum(lengths, dtype=np.int64) ])
+
+        if arcs:
+            deltas = np.concatenate([ np.asarray(arc, dtype=dtype).reshape(-1, 2) for arc in arcs ])
+        else:
+            deltas = np.zeros((0, 2), dtype=dtype)
+
+        refs = list()
+        ref_offsets = [ 0 ]
+
+        def pack_arc(line):
+            refs.extend(line)
+            ref_offsets.append(len(refs))
+            return len(ref_offsets) - 2
+
+        header['objects'] = map_arcs(header['objects'], pack_arc)
+
+        return cls(
+            header,
+            deltas,
+            arc_offsets,
+            np.array(refs, dtype=np.int32),
+            np.array(ref_offsets, dtype=np.int64),
+            trees)
+
+    def save(self, filename):
+        """ Write packed layout to file `filename`
+        """
+
+        arrays = [
+            ('deltas', self.deltas),
+            ('arc_offsets', self.arc_offsets),
+            ('refs', self.refs),
+            ('ref_offsets', self.ref_offsets)
+        ]
+
+        for name in sorted(self.trees):
+            arrays.append(('%s_boxes' % name, self.trees[name].boxes))
+            arrays.append(('%s_indices' % name, self.trees[name].indices))
+
+        arrays = [ (name, np.ascontiguousarray(array, dtype=np.dtype(array.dtype).newbyteorder('<')))
+                   for name, array in arrays ]
+
+        # header size depends on array offsets, which depend on header size :
+        # reserve room for offsets until the header length is stable
+
+        header = dict(self.header)
+        size = 0
+
+        while True:
+
+            offset = _aligned(len(MAGIC) + 8 + size)
+            header['arrays'] = dict()
+
+            for name, array in arrays:
+                header['arrays'][name] = {
+                    'offset': offset,
+                    'dtype': array.dtype.str,
+                    'shape': list(array.shape)
+                }
+                offset = _aligned(offset + array.nbytes)
+
+            text = json.dumps(header).encode('utf-8')
+
+            if _aligned(len(text)) == size:
+                break
+
+            size = _aligned(len(text))
+
+        with open(filename, 'wb') as fp:
+
+            fp.write(MAGIC)
+            fp.write(np.array([ size ], dtype='<u8').tobytes())
+            fp.write(text + b' ' * (size - len(text)))
+
+            for name, array in arrays:
+                fp.seek(header['arrays'][name]['offset'])
+                fp.write(array.tobytes())
+
+    @classmethod
+    def load(cls, filename, mmap=True):
+        """ Load file written by `save`,
+        arrays being memory-mapped unless mmap is False
+        """
+
+        with open(filename, 'rb') as fp:
+
+            if fp.read(len(MAGIC)) != MAGIC:
+                raise ValueError('Not a packed topology file: %s' % filename)
+
+            size = int(np.frombuffer(fp.read(8), dtype='<u8')[0])
+            header = json.loads(fp.read(size).decode('utf-8'))
+
+        arrays = header.pop('arrays')
+
+        def read(name):
+
+            info = arrays[name]
+            shape = tuple(info['shape'])
+
+            if mmap and np.prod(shape) > 0:
+                return np.memmap(filename, dtype=np.dtype(info['dtype']), mode='r', offset=info['offset'], shape=shape)
+
+            with open(filename, 'rb') as fp:
+                fp.seek(info['offset'])
+                count = int(np.prod(shape))
+                return np.fromfile(fp, dtype=np.dtype(info['dtype']), count=count).reshape(shape)
+
+        trees = { name: PackedRTree(read('%s_boxes' % name), read('%s_indices' % name), tree['node_size'])
+                  for name, tree in header.get('index', {}).items() }
+
+        return cls(header, read('deltas'), read('arc_offsets'), read('refs'), read('ref_offsets'), trees)
+
+    def decode(self, arcs=None):
+        """
+        Absolute coordinates of arcs,
+        with the TopoJSON transform applied if any,
+        see `topology.decode_arcs`.
+
+        Parameters
+        ----------
+
+        arcs: array-like of int, optional
+            Indexes of arcs to decode, all arcs by default
+
+        Returns
+        -------
+
+        List of numpy-arrays, shape (k, 2)
+        """
+
+        transform = self.header.get('transform')
+
+        if arcs is None:
+            return decode_arcs(self.deltas, self.arc_offsets, transform)
+
+        arcs = np.asarray(arcs, dtype=np.int64)
+        start = np.asarray(self.arc_offsets[arcs])
+        end = np.asarray(self.arc_offsets[arcs + 1])
+        offsets = np.concatenate([ [ 0 ], np.cumsum(end - start) ])
+        deltas = np.concatenate([ np.zeros((0, 2), dtype=self.deltas.dtype) ] +
+                                [ self.deltas[ a:b ] for a, b in zip(start, end) ])
+
+        return decode_arcs(deltas, offsets, transform)
+
+    def line(self, index):
+        """ Arc references of line or ring `index`
+        """
+
+        return self.refs[ self.ref_offsets[index]:self.ref_offsets[index+1] ].tolist()
+
+    def to_topojson(self):
+        """ TopoJSON object, see `topology.topology`
+        """
+
+        topojson = json.loads(json.dumps(self.header))
+        topojson['objects'] = map_arcs(topojson['objects'], self.line)
+
+        offsets = self.arc_offsets
+        topojson['arcs'] = [ self.deltas[ a:b ].tolist() for a, b in zip(offsets[:-1], offsets[1:]) ]
+
+        if self.trees:
+            topojson['index'] = { name: tree.to_json() for name, tree in self.trees.items() }
+
+        return topojson
+
+    def unpack(self, lazy=False):
+        """ Convert to GeoJSON, see `topology.unpack`
+        """
+
+        objects = json.loads(json.dumps(self.header['objects']))
+        objects = map_arcs(objects, self.line)
+
+        if lazy:
+            arcs = LazyArcs(lambda i: self.decode([ i ])[0], len(self.arc_offsets) - 1)
+            return lazy_objects(objects, arcs)
+
+        return unpack_objects(objects, self.decode())
+
+    def query(self, bbox):
+        """
+        Members of objects whose bounding box intersects `bbox`,
+        decoding only the arcs they use, see `packed_rtree.TopologyIndex.query`
+        """
+
+        ids = self.trees['objects'].search(bbox)
+        members = self.members
+
+        return ids, unpack_members([ members[i] for i in ids ], self.line, self.decode)
+
+def dump(topojson, filename):
+    """ Write TopoJSON object to a packed topology file
+    """
+
+    PackedTopology.from_topojson(topojson).save(filename)
+
+def load(filename, mmap=True):
+    """ Memory-map a packed topology file
+    """
+
+    return PackedTopology.load(filename, mmap)
@@ -0,0 +1,400 @@
+# coding: utf-8
+""" Topology that can be edited feature by feature.
+
+    The coordinate index and the arc fingerprints are kept between edits :
+
+    - for each vertex, the line end points and the (previous, next)
+      neighbor pairs of the parts (lines and rings) passing through it,
+      from which its junction status follows, see `topology.junction` ;
+
+    - for each distinct arc, its canonical vertex sequence,
+      see `topology.fingerprint`.
+
+    Adding, removing or replacing a feature updates the index
+    for the vertices of the feature, and only re-cuts and re-deduplicates
+    the feature's parts and the parts passing through a vertex
+    whose junction status changed.
+"""
+
+import numpy as np
+from collections import defaultdict, OrderedDict
+from itertools import count
+import json
+
+from topology import extract_geometry, map_arcs, quantize, closed_arcs, fingerprint, delta_encode
+
+class IncrementalTopology(object):
+    """
+    Editable collection of features and its TopoJSON topology.
+
+    Parameters
+    ----------
+
+    bbox: list [ minx, miny, maxx, maxy ]
+        Extent of the quantization grid ;
+        features may extend beyond it,
+        as long as quantized coordinates fit in int32
+
+    quantization: number, > 1
+        see `topology.topology`
+    """
+
+    def __init__(self, bbox, quantization=1e6):
+
+        if quantization <= 1:
+            raise ValueError('Incremental topology requires quantization > 1')
+
+        self.bbox = list(bbox)
+        self.quantization = quantization
+        self.transform = quantize(np.zeros((0, 2)), self.bbox, quantization)[1]
+
+        # features, in order: key -> (object, part ids)
+        self.features = OrderedDict()
+        self.feature_keys = count()
+
+        # parts: part id -> (coordinates, vertex keys, ring flag)
+        self.parts = dict()
+        self.part_ids = count()
+
+        # vertex index: vertex key -> ...
+        self.ends = defaultdict(int)
+        self.pairs = defaultdict(lambda: defaultdict(int))
+        self.owners = defaultdict(set)
+
+        # arcs: part id -> list of (arc id, sign)
+        self.part_arcs = dict()
+        # arc id -> [ canonical key, delta-encoded coordinates, flip, reference count ]
+        self.arcs = dict()
+        self.fingerprints = dict()
+        self.arc_ids = count()
+
+    @classmethod
+    def from_geojson(cls, geojson, quantization=1e6, bbox=None):
+        """
+        Build from a GeoJSON FeatureCollection,
+        over its bounding box by default.
+        """
+
+        features = geojson['features']
+
+        if bbox is None:
+            coordinates = list()
+            collect = lambda line: coordinates.extend(map(tuple, line))
+            for feature in features:
+                extract_geometry(feature, collect, collect)
+            coordinates = np.array(coordinates, dtype=np.float64)[ :, :2 ]
+            bbox = [ coordinates[:, 0].min(), coordinates[:, 1].min(),
+                     coordinates[:, 0].max(), coordinates[:, 1].max() ]
+
+        topology = cls(bbox, quantization)
+        topology.add_many(features)
+
+        return topology
+
+    # Vertex index
+
+    def vertex_keys(self, coordinates):
+        """ Single int64 key of quantized coordinates,
+        ordered as (x, y) pairs
+        """
+
+        return (coordinates[ :, 0 ].astype(np.int64) << 32) + coordinates[ :, 1 ].astype(np.int64)
+
+    def is_junction(self, key):
+
+        return self.ends.get(key, 0) > 0 or len(self.pairs.get(key, ())) > 1
+
+    def part_pairs(self, part):
+        """ (vertex key, neighbor pair) of the first visit
+        of each vertex of `part`, see `topology.junction`
+        """
+
+        _, keys, ring = self.parts[part]
+        keys = keys.tolist()
+        n = len(keys)
+        visited = set()
+
+        if ring:
+            positions = range(0, n-1)
+        else:
+            positions = range(1, n-1)
+
+        for i in positions:
+
+            key = keys[i]
+            if key in visited:
+                continue
+
+            visited.add(key)
+            previous = keys[i-1] if i > 0 else keys[n-2]
+            following = keys[i+1]
+
+            yield key, (min(previous, following), max(previous, following))
+
+    def register(self, part, sign):
+        """ Add (sign = 1) or remove (sign = -1) a part from the vertex index
+        """
+
+        _, keys, ring = self.parts[part]
+
+        if not ring:
+            self.ends[ keys[0] ] += sign
+            self.ends[ keys[-1] ] += sign
+
+        for key, pair in self.part_pairs(part):
+
+            pairs = self.pairs[key]
+            pairs[pair] += sign
+
+            if pairs[pair] == 0:
+                del pairs[pair]
+
+        distinct = set(keys.tolist())
+
+        for key in distinct:
+
+            if sign > 0:
+                self.owners[key].add(part)
+            else:
+                self.owners[key].discard(part)
+
+        if sign < 0:
+            for key in distinct:
+                if self.ends.get(key) == 0:
+                    del self.ends[key]
+                if key in self.pairs and not self.pairs[key]:
+                    del self.pairs[key]
+                if not self.owners[key]:
+                    del self.owners[key]
+
+    # Arcs
+
+    def release(self, part):
+        """ Drop references from `part` to its arcs
+        """
+
+        for arc, _ in self.part_arcs.pop(part, ()):
+
+            record = self.arcs[arc]
+            record[3] -= 1
+
+            if record[3] == 0:
+                del self.fingerprints[ record[0] ]
+                del self.arcs[arc]
+
+    def cut_part(self, part):
+        """ Arcs of `part`, as (start, end, whole) virtual positions,
+        see `topology.cut` and `topology.arc_sequences`
+        """
+
+        _, keys, ring = self.parts[part]
+        keys = keys.tolist()
+        b = len(keys) - 1
+
+        cuts = [ i for i in range(1, b) if self.is_junction(keys[i]) ]
+        shift = 0
+
+        if ring and cuts and not self.is_junction(keys[0]):
+            shift = cuts.pop(0)
+
+        boundaries = [ shift ] + cuts + [ b + shift ]
+        whole = ring and len(boundaries) == 2 and not self.is_junction(keys[shift])
+
+        return [ (start, end, whole) for start, end in zip(boundaries[:-1], boundaries[1:]) ]
+
+    def cut_and_dedup(self, parts):
+        """ Re-cut `parts` and deduplicate their arcs
+        against all arcs
+        """
+
+        for part in parts:
+            self.release(part)
+
+        pieces = list()
+
+        for part in parts:
+
+            coordinates, keys, _ = self.parts[part]
+            b = len(keys) - 1
+
+            for start, end, whole in self.cut_part(part):
+
+                positions = np.arange(start, end + 1)
+                positions[ positions > b ] -= b
+                pieces.append((part, coordinates[positions], keys[positions], whole))
+
+        if not pieces:
+            return
+
+        whole = np.array([ piece[3] for piece in pieces ], dtype=np.bool_)
+        sequences = np.concatenate([ piece[2][:-1] if piece[3] else piece[2] for piece in pieces ])
+        length = np.array([ len(piece[2]) for piece in pieces ], dtype=np.int64) - whole
+
+        closed, loop, length, sequences = closed_arcs(sequences, length, whole)
+        _, flip, canonical = fingerprint(sequences, length, closed)
+        start = np.cumsum(length) - length
+
+        for i, (part, coordinates, keys, _) in enumerate(pieces):
+
+            # loops keep their start vertex, see `topology.group_arcs`
+            anchor = int(keys[0]) if loop[i] else None
+            key = (bool(closed[i]), anchor, canonical[ start[i]:start[i]+length[i] ].tobytes())
+            arc = self.fingerprints.get(key)
+
+            if arc is None:
+                arc = next(self.arc_ids)
+                self.fingerprints[key] = arc
+                self.arcs[arc] = [ key, delta_encode(coordinates.tolist()), flip[i], 0 ]
+
+            record = self.arcs[arc]
+            record[3] += 1
+            self.part_arcs.setdefault(part, list()).append((arc, 1 if record[2] == flip[i] else -1))
+
+    # Edits
+
+    def extract(self, feature):
+        """ Quantize and store the parts of a feature
+
+        Returns
+        -------
+
+        (object, part ids), see `topology.extract`
+        """
+
+        parts = list()
+
+        def extract_part(line_coords, ring):
+
+            coordinates, _ = quantize(np.array(line_coords, dtype=np.float64)[ :, :2 ], self.bbox, self.quantization)
+            coordinates = coordinates.astype(np.int64)
+            part = next(self.part_ids)
+            self.parts[part] = (coordinates, self.vertex_keys(coordinates), ring)
+            parts.append(part)
+
+            return part
+
+        obj = extract_geometry(
+            feature,
+            lambda line: extract_part(line, False),
+            lambda line: extract_part(line, True))
+
+        return obj, parts
+
+    def update(self, added, removed):
+        """ Apply the addition of parts `added`
+        and the removal of parts `removed`
+        """
+
+        changed = set()
+        touched = set()
+
+        for part in removed + added:
+            touched.update(self.parts[part][1].tolist())
+
+        before = { key: self.is_junction(key) for key in touched }
+
+        for part in removed:
+            self.register(part, -1)
+            self.release(part)
+            del self.parts[part]
+
+        for part in added:
+            self.register(part, 1)
+
+        for key in touched:
+            if self.is_junction(key) != before[key]:
+                changed.add(key)
+
+        affected = set(added)
+        for key in changed:
+            affected.update(self.owners.get(key, ()))
+
+        self.cut_and_dedup(sorted(affected))
+
+    def add_many(self, features, keys=None):
+        """ Append features, in order
+
+        Returns
+        -------
+
+        List of feature keys,
+        `keys` if given, or feature ids, or sequence numbers
+        """
+
+        added = list()
+        result = list()
+
+        for i, feature in enumerate(features):
+
+            if keys is not None:
+                key = keys[i]
+            elif feature.get('id') is not None:
+                key = feature['id']
+            else:
+                key = next(self.feature_keys)
+
+            if key in self.features:
+                raise KeyError('Duplicate feature key %s' % key)
+
+            obj, parts = self.extract(feature)
+            self.features[key] = (obj, parts)
+            added.extend(parts)
+            result.append(key)
+
+        self.update(added, [])
+
+        return result
+
+    def add(self, feature, key=None):
+        """ Append one feature, see `add_many`
+        """
+
+        return self.add_many([ feature ], None if key is None else [ key ])[0]
+
+    def remove(self, key):
+        """ Remove feature `key`
+        """
+
+        _, parts = self.features.pop(key)
+        self.update([], parts)
+
+    def replace(self, key, feature):
+        """ Replace feature `key`, keeping its position
+        """
+
+        _, old_parts = self.features[key]
+        obj, parts = self.extract(feature)
+        self.features[key] = (obj, parts)
+        self.update(parts, old_parts)
+
+    # Output
+
+    def to_topojson(self):
+        """
+        TopoJSON object of the current features.
+
+        Arcs are the same as `topology.topology` given the same
+        quantization grid, possibly in a different order and direction ;
+        rings made of a single arc may start at another vertex.
+        """
+
+        number = dict()
+        arcs = list()
+
+        for arc in sorted(self.arcs):
+            number[arc] = len(arcs) + 1
+            arcs.append(self.arcs[arc][1])
+
+        def map_arc(part):
+            return [ sign * number[arc] for arc, sign in self.part_arcs[part] ]
+
+        geometries = [ map_arcs(json.loads(json.dumps(obj)), map_arc)
+                       for obj, _ in self.features.values() ]
+
+        return {
+            'arcs': arcs,
+            'objects': { 'geometries': geometries, 'type': 'FeatureCollection' },
+            'bbox': self.bbox,
+            'transform': self.transform,
+            'type': 'Topology'
+        }
@@ -0,0 +1,460 @@
+# coding: utf-8
+""" Packed static R-tree over the arcs and objects of a TopoJSON topology.
+
+    Items are sorted by the Hilbert index of their bounding box center,
+    and packed bottom-up into nodes of `node_size` children,
+    all levels being stored one after the other in a single array of boxes,
+    leaves first. Queries walk the tree one level at a time,
+    all nodes of a level being tested at once.
+
+    Boxes are in the coordinates of the GeoJSON input,
+    TopoJSON transform applied.
+
+    Notes
+    -----
+
+    [1] Agafonkin, Vladimir. Flatbush, A really fast static spatial index
+        for 2D points and rectangles in JavaScript.
+        https://github.com/mourner/flatbush
+        ISC Licensed
+"""
+
+import numpy as np
+import json
+
+from topology import map_arcs, unpack_objects, decode_arcs, _ranges
+
+HILBERT_MAX = (1 << 16) - 1
+
+def _interleave(x):
+
+    x = (x | (x << 8)) & 0x00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F
+    x = (x | (x << 2)) & 0x33333333
+    x = (x | (x << 1)) & 0x55555555
+
+    return x
+
+def hilbert(x, y):
+    """
+    Index along a Hilbert curve of order 16
+    of integer coordinates 0 <= x, y < 2**16, see [1].
+
+    Returns
+    -------
+
+    numpy-array, dtype int64
+    """
+
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    for shift in (2, 4):
+        a, b, c, d = A, B, C, D
+        A = (a & (a >> shift)) ^ (b & (b >> shift))
+        B = (a & (b >> shift)) ^ (b & ((a ^ b) >> shift))
+        C = c ^ (a & (c >> shift)) ^ (b & (d >> shift))
+        D = d ^ (b & (c >> shift)) ^ ((a ^ b) & (d >> shift))
+
+    a, b, c, d = A, B, C, D
+    C = c ^ (a & (c >> 8)) ^ (b & (d >> 8))
+    D = d ^ (b & (c >> 8)) ^ ((a ^ b) & (d >> 8))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+
+    return (_interleave(i1) << 1) | _interleave(i0)
+
+class PackedRTree(object):
+    """
+    Static R-tree stored as flat arrays.
+
+    Parameters
+    ----------
+
+    boxes: numpy-array, shape (nodes, 4), dtype float64
+        [ minx, miny, maxx, maxy ] of all nodes, level by level,
+        from leaves to root
+
+    indices: numpy-array, shape (n,), dtype int64
+        Item of each leaf
+
+    node_size: int
+        Number of children per node
+    """
+
+    def __init__(self, boxes, indices, node_size=16):
+
+        self.boxes = boxes
+        self.indices = indices
+        self.node_size = node_size
+
+        # start of each level in boxes, followed by the number of nodes
+
+        n = len(indices)
+        levels = [ 0 ]
+
+        while n > 0:
+            levels.append(levels[-1] + n)
+            if n == 1:
+                break
+            n = (n + node_size - 1) // node_size
+
+        self.levels = levels
+
+    def __len__(self):
+        return len(self.indices)
+
+    @classmethod
+    def build(cls, boxes, node_size=16):
+        """
+        Pack items given by their bounding boxes,
+        array-like of shape (n, 4)
+        """
+
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        n = len(boxes)
+
+        if n == 0:
+            return cls(np.zeros((0, 4)), np.zeros(0, dtype=np.int64), node_size)
+
+        # centers on a 2**16 grid, empty boxes (infinite) at the origin
+
+        with np.errstate(invalid='ignore'):
+            center = (boxes[ :, :2 ] + boxes[ :, 2: ]) / 2
+
+        valid = np.all(np.isfinite(center), axis=1)
+        center[~valid] = 0
+
+        if np.any(valid):
+            low = center[valid].min(axis=0)
+            size = center[valid].max(axis=0) - low
+            size[ size == 0 ] = 1
+            center[valid] = np.floor(HILBERT_MAX * (center[valid] - low) / size)
+
+        indices = np.argsort(hilbert(center[ :, 0 ], center[ :, 1 ]), kind='mergesort')
+        levels = [ boxes[indices] ]
+
+        while len(levels[-1]) > 1:
+
+            children = levels[-1]
+            start = np.arange(0, len(children), node_size)
+
+            levels.append(np.column_stack([
+                np.minimum.reduceat(children[ :, 0 ], start),
+                np.minimum.reduceat(children[ :, 1 ], start),
+                np.maximum.reduceat(children[ :, 2 ], start),
+                np.maximum.reduceat(children[ :, 3 ], start)
+            ]))
+
+        return cls(np.concatenate(levels), indices, node_size)
+
+    def search(self, bbox):
+        """
+        Items whose bounding box intersects `bbox`
+        [ minx, miny, maxx, maxy ]
+
+        Returns
+        -------
+
+        numpy-array, dtype int64, sorted item indexes
+        """
+
+        if len(self.indices) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        minx, miny, maxx, maxy = bbox
+        levels = self.levels
+        nodes = np.zeros(1, dtype=np.int64)
+
+        for level in range(len(levels) - 2, -1, -1):
+
+            boxes = self.boxes[ levels[level] + nodes ]
+            nodes = nodes[ (boxes[ :, 0 ] <= maxx) & (boxes[ :, 1 ] <= maxy) &
+                           (boxes[ :, 2 ] >= minx) & (boxes[ :, 3 ] >= miny) ]
+
+            if level > 0:
+                size = levels[level] - levels[level-1]
+                start = nodes * self.node_size
+                nodes, _ = _ranges(start, np.minimum(start + self.node_size, size))
+
+        return np.sort(self.indices[nodes])
+
+    def to_json(self):
+        """ JSON-serializable form, see `from_json`
+        """
+
+        return {
+            'node_size': self.node_size,
+            'boxes': self.boxes.ravel().tolist(),
+            'indices': self.indices.tolist()
+        }
+
+    @classmethod
+    def from_json(cls, tree):
+
+        return cls(
+            np.array(tree['boxes'], dtype=np.float64).reshape(-1, 4),
+            np.array(tree['indices'], dtype=np.int64),
+            tree['node_size'])
+
+def object_members(objects):
+    """
+    Items of the object index: members of top-level collections,
+    or top-level objects themselves, named objects being taken
+    in sorted order of their names.
+    """
+
+    if objects.has_key('type'):
+        objects = { None: objects }
+
+    members = list()
+
+    for key in sorted(objects):
+
+        obj = objects[key]
+
+        if obj['type'] in ('FeatureCollection', 'GeometryCollection'):
+            members.extend(obj['geometries'])
+        else:
+            members.append(obj)
+
+    return members
+
+def member_lines(member):
+    """ Lines and rings of arc references of TopoJSON geometry `member`
+    """
+
+    lines = list()
+
+    def collect(line):
+        lines.append(line)
+        return line
+
+    map_arcs(member, collect)
+
+    return lines
+
+def member_points(member):
+    """ Point coordinates of TopoJSON geometry `member`
+    """
+
+    component_type = member['type']
+
+    if component_type == 'Point':
+        return [ member['coordinates'] ]
+
+    elif component_type == 'MultiPoint':
+        return list(member['coordinates'])
+
+    elif component_type == 'GeometryCollection':
+        return [ point for geometry in member['geometries'] for point in member_points(geometry) ]
+
+    return list()
+
+def arc_boxes(coordinates, offsets, transform=None):
+    """
+    Bounding box of each arc, given as coordinates and offsets,
+    see `topology.arc_coordinates`.
+
+    Returns
+    -------
+
+    numpy-array, shape (arcs, 4), TopoJSON transform applied
+    """
+
+    if len(offsets) < 2:
+        return np.zeros((0, 4))
+
+    start = offsets[:-1]
+    boxes = np.column_stack([
+        np.minimum.reduceat(coordinates[ :, 0 ], start),
+        np.minimum.reduceat(coordinates[ :, 1 ], start),
+        np.maximum.reduceat(coordinates[ :, 0 ], start),
+        np.maximum.reduceat(coordinates[ :, 1 ], start)
+    ]).astype(np.float64)
+
+    if transform:
+        boxes = boxes * (transform['scale'] * 2) + (transform['translate'] * 2)
+
+    return boxes
+
+def member_boxes(members, boxes):
+    """
+    Bounding box of each member, from the boxes of its arcs,
+    see `arc_boxes`, and its points.
+
+    Returns
+    -------
+
+    numpy-array, shape (members, 4)
+    """
+
+    result = np.empty((len(members), 4))
+    result[ :, :2 ] = np.inf
+    result[ :, 2: ] = -np.inf
+
+    owner = list()
+    arcs = list()
+
+    for i, member in enumerate(members):
+
+        for line in member_lines(member):
+            owner.extend([ i ] * len(line))
+            arcs.extend(line)
+
+        points = member_points(member)
+
+        if points:
+            points = np.array(points, dtype=np.float64)[ :, :2 ]
+            result[ i, :2 ] = points.min(axis=0)
+            result[ i, 2: ] = points.max(axis=0)
+
+    owner = np.array(owner, dtype=np.int64)
+    arcs = np.array(arcs, dtype=np.int64)
+    arcs = np.where(arcs < 0, ~arcs, arcs - 1)
+
+    for column, reduce in enumerate((np.minimum, np.minimum, np.maximum, np.maximum)):
+        reduce.at(result[ :, column ], owner, boxes[ arcs, column ])
+
+    return result
+
+def spatial_index(coordinates, offsets, objects, transform=None, node_size=16):
+    """
+    R-trees over arcs and over members of TopoJSON `objects`,
+    see `object_members`, given the arcs as coordinates and offsets.
+
+    Returns
+    -------
+
+    dict-like, { 'arcs': tree, 'objects': tree },
+    trees being in JSON form, see `PackedRTree.to_json`
+    """
+
+    boxes = arc_boxes(coordinates, offsets, transform)
+    members = object_members(objects)
+
+    return {
+        'arcs': PackedRTree.build(boxes, node_size).to_json(),
+        'objects': PackedRTree.build(member_boxes(members, boxes), node_size).to_json()
+    }
+
+def unpack_members(members, lines, decode):
+    """
+    Convert selected members to GeoJSON, decoding only the arcs they use.
+
+    Parameters
+    ----------
+
+    members: list of TopoJSON geometries
+
+    lines: callable
+        lines(line) returns the arc references of a line or ring
+        of members, eg. the identity
+
+    decode: callable
+        decode(arcs) returns the absolute coordinates of arcs,
+        given as an array of indexes
+
+    Returns
+    -------
+
+    list of GeoJSON geometries or features
+    """
+
+    members = [ map_arcs(json.loads(json.dumps(member)), lines) for member in members ]
+
+    refs = np.array([ ref for member in members for line in member_lines(member) for ref in line ], dtype=np.int64)
+    arcs = np.unique(np.where(refs < 0, ~refs, refs - 1))
+
+    decoded = dict(zip(arcs.tolist(), decode(arcs)))
+    collection = { 'geometries': members, 'type': 'GeometryCollection' }
+
+    return unpack_objects(collection, decoded)['geometries']
+
+class TopologyIndex(object):
+    """
+    Bounding box queries over a TopoJSON topology
+    built with `topology(..., spatial_index=True)`,
+    trees and object members being built once for all queries.
+
+    Parameters
+    ----------
+
+    topojson: dict-like
+        TopoJSON object with an 'index' member,
+        see `spatial_index`
+    """
+
+    def __init__(self, topojson):
+
+        self.topojson = topojson
+        self.arcs = PackedRTree.from_json(topojson['index']['arcs'])
+        self.objects = PackedRTree.from_json(topojson['index']['objects'])
+        self.members = object_members(topojson['objects'])
+
+    def decode(self, arcs):
+        """ Absolute coordinates of arcs, given as an array of indexes
+        """
+
+        arcs = [ self.topojson['arcs'][i] for i in arcs ]
+        offsets = np.concatenate([ [ 0 ], np.cumsum([ len(arc) for arc in arcs ], dtype=np.int64) ])
+        deltas = np.array([ delta for arc in arcs for delta in arc ]).reshape(-1, 2)
+
+        return decode_arcs(deltas, offsets, self.topojson.get('transform'))
+
+    def query(self, bbox):
+        """
+        Members of TopoJSON objects whose bounding box intersects `bbox`,
+        decoding only the arcs they use.
+
+        Returns
+        -------
+
+        ids: numpy-array, dtype int64
+            Indexes of members, see `object_members`
+
+        geojson: list of GeoJSON geometries or features
+        """
+
+        ids = self.objects.search(bbox)
+        members = self.members
+
+        return ids, unpack_members([ members[i] for i in ids ], lambda line: line, self.decode)
+
+    def query_arcs(self, bbox):
+        """ Indexes of arcs whose bounding box intersects `bbox`
+        """
+
+        return self.arcs.search(bbox)
+
+def query(topojson, bbox):
+    """
+    Members of TopoJSON objects whose bounding box intersects `bbox`,
+    see `TopologyIndex.query`.
+    This builds the index on every call :
+    use a `TopologyIndex` for repeated queries.
+    """
+
+    return TopologyIndex(topojson).query(bbox)
+
+def query_arcs(topojson, bbox):
+    """
+    Indexes of arcs whose bounding box intersects `bbox`,
+    see `TopologyIndex.query_arcs`
+    """
+
+    return PackedRTree.from_json(topojson['index']['arcs']).search(bbox)
@@ -0,0 +1,295 @@
+# coding: utf-8
+""" Parallel topology build, partitioned in space.
+
+    After quantization against the global bounding box,
+    vertices are split into vertical strips (tiles along x)
+    holding about the same number of vertices,
+    such that all vertices with the same coordinates fall in the same strip.
+    Each step that compares vertices then runs strip by strip
+    in a pool of worker processes :
+
+    - vertex index and rank : vertices of one strip ;
+
+    - junctions : neighbor triples whose middle vertex is in the strip ;
+
+    - deduplication : arcs whose anchor vertex is in the strip,
+      equal arcs sharing their anchor vertex, see `topology.group_arcs`.
+
+    Arcs that cross strip borders are cut and compared as a whole,
+    so that the result is identical to `topology.topology`.
+"""
+
+import numpy as np
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from topology import (
+    extract, copy_key, map_arcs, bounds, quantize, index, _rank, _ranges,
+    neighbors, junction_vertices, cut, arc_sequences, group_arcs, arc_references,
+    arc_coordinates, simplify_coordinates, delta, map_geometries
+)
+
+def _map(func, tasks, executor):
+    """ Apply func to tasks in order,
+    either in this process or in a pool of worker processes
+    """
+
+    if executor is None:
+        return map(func, tasks)
+
+    return list(executor.map(func, tasks))
+
+def _bounds(offsets, chunks):
+    """ Split items given by offsets into at most `chunks` ranges
+    of about the same total size
+    """
+
+    count = len(offsets) - 1
+    bounds = np.searchsorted(offsets, np.linspace(0, offsets[-1], chunks + 1)[1:-1])
+    return np.unique(np.concatenate([ [ 0 ], np.minimum(bounds, count), [ count ] ]))
+
+def _extract_chunk(features):
+    """ Worker process entry point: extract a chunk of features
+    """
+
+    coordinates, parts, ring, objects = extract({ 'type': 'FeatureCollection', 'features': features })
+    return coordinates.reshape(-1, 2), parts, ring, objects['geometries']
+
+def _index_strip(coordinates):
+    """ Worker process entry point: index and rank of vertices of one strip
+    """
+
+    ranks = _rank(coordinates)
+    distinct = ranks.max() + 1 if len(ranks) else 0
+
+    return index(coordinates), ranks, distinct
+
+def _junction_strip(triples):
+    """ Worker process entry point: junctions of one strip
+    """
+
+    return junction_vertices(*triples)
+
+def _group_strip(args):
+    """ Worker process entry point: equal arcs of one strip
+    """
+
+    return group_arcs(*args)
+
+def _delta_chunk(args):
+    """ Worker process entry point: delta-encode a range of arcs
+    """
+
+    return delta(*args)
+
+def extract_parallel(geojson, executor=None, chunks=1):
+    """
+    Same as `topology.extract`,
+    features of a FeatureCollection being extracted in `chunks` chunks.
+    """
+
+    if geojson.get('type') != 'FeatureCollection' or chunks <= 1:
+        return extract(geojson)
+
+    features = geojson['features']
+    bounds = np.linspace(0, len(features), chunks + 1).astype(int)
+    tasks = [ features[a:b] for a, b in zip(bounds[:-1], bounds[1:]) ]
+
+    coordinates = list()
+    parts = list()
+    ring = list()
+    geometries = list()
+    vertex_count = 0
+    part_count = 0
+
+    for coords, chunk_parts, chunk_ring, chunk_geometries in _map(_extract_chunk, tasks, executor):
+
+        shift = part_count
+        for geometry in chunk_geometries:
+            map_arcs(geometry, lambda part: part + shift)
+
+        coordinates.append(coords)
+        parts.append(chunk_parts + vertex_count)
+        ring.append(chunk_ring)
+        geometries.extend(chunk_geometries)
+
+        vertex_count += len(coords)
+        part_count += len(chunk_parts)
+
+    objects = { 'geometries': geometries, 'type': 'FeatureCollection' }
+    copy_key(geojson, objects, 'bbox', 'crs')
+
+    return np.concatenate(coordinates), np.concatenate(parts), np.concatenate(ring), objects
+
+def strips(coordinates, count):
+    """
+    Split vertices into at most `count` vertical strips
+    of about the same number of vertices,
+    vertices with the same x coordinate being in the same strip.
+
+    Returns
+    -------
+
+    numpy-array, shape (n,), dtype int64
+        Strip of each vertex, strips being ordered by increasing x
+    """
+
+    x = coordinates[ :, 0 ]
+    sample = np.sort(x[ ::max(1, len(x) // 100000) ])
+
+    if len(sample) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    boundaries = np.unique(sample[ len(sample) * np.arange(1, count) // count ])
+
+    return np.searchsorted(boundaries, x, side='left')
+
+def _partition(keys, count):
+    """ Indexes of items with key 0, 1, ... count-1,
+    in increasing order
+    """
+
+    order = np.argsort(keys, kind='mergesort')
+    return np.split(order, np.searchsorted(keys[order], np.arange(1, count)))
+
+def topology_parallel(geojson, quantization=1e6, simplification=0, processes=None, tiles=None):
+    """
+    Convert GeoJSON to TopoJSON, using several processes.
+
+    The result is identical to `topology.topology`.
+
+    Parameters
+    ----------
+
+    geojson, quantization, simplification:
+        see `topology.topology`
+
+    processes: int
+        Number of worker processes,
+        defaults to the number of CPUs.
+        With 1 process, all steps run in this process,
+        strip by strip.
+
+    tiles: int
+        Number of vertical strips the vertices are split into,
+        defaults to 4 strips per process
+
+    Returns
+    -------
+
+    topojson: dict-like TopoJSON object
+    """
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    if tiles is None:
+        tiles = 4 * processes
+
+    executor = ProcessPoolExecutor(max_workers=processes) if processes > 1 else None
+
+    try:
+        return _topology_parallel(geojson, quantization, simplification, processes, tiles, executor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def _topology_parallel(geojson, quantization, simplification, processes, tiles, executor):
+
+    coordinates, parts, ring, objects = extract_parallel(geojson, executor, tiles)
+
+    bbox = bounds(coordinates)
+    quantized, transform = quantize(coordinates, bbox, quantization)
+    del coordinates
+
+    n = len(quantized)
+    strip = strips(quantized, tiles)
+    count = strip.max() + 1 if n else 0
+    vertices = _partition(strip, count)
+
+    # Index of first occurrence and lexicographic rank of each vertex
+
+    indexes = np.empty(n, dtype=np.int64)
+    ranks = np.empty(n, dtype=np.int64)
+    rank_start = np.zeros(count, dtype=np.int64)
+    distinct = 0
+
+    results = _map(_index_strip, [ quantized[positions] for positions in vertices ], executor)
+
+    for s, (positions, (strip_index, strip_ranks, strip_distinct)) in enumerate(zip(vertices, results)):
+
+        indexes[positions] = positions[strip_index]
+        ranks[positions] = strip_ranks + distinct
+        rank_start[s] = distinct
+        distinct += strip_distinct
+
+    # Junctions, by strip of the middle vertex of neighbor triples
+
+    junctions = np.zeros(n, dtype=np.bool_)
+    junctions[ indexes[ parts[ ~ring, 0 ] ] ] = True
+    junctions[ indexes[ parts[ ~ring, 1 ] ] ] = True
+
+    triples = neighbors(indexes, parts, ring)
+    tasks = [ tuple(x[selection] for x in triples)
+              for selection in _partition(strip[ triples[2] ], count) ]
+
+    for strip_junctions in _map(_junction_strip, tasks, executor):
+        junctions[strip_junctions] = True
+
+    table = cut(quantized, parts, ring, junctions[indexes])
+
+    # Duplicate arcs, by strip of their anchor vertex :
+    # the first canonical vertex, the start of loops
+    # or the minimum vertex of whole rings
+
+    whole, length, sequences = arc_sequences(ranks, parts, ring, table)
+    start = np.cumsum(length) - length
+    m = len(table)
+
+    anchor = np.minimum(sequences[start], sequences[ start + length - 1 ])
+    if np.any(whole):
+        anchor[whole] = np.minimum.reduceat(sequences, start)[whole]
+
+    arc_strip = np.searchsorted(rank_start, anchor, side='right') - 1
+    arc_groups = _partition(arc_strip, count)
+
+    tasks = list()
+    for selection in arc_groups:
+        positions, _ = _ranges(start[selection], start[selection] + length[selection])
+        tasks.append((sequences[positions], length[selection], whole[selection]))
+
+    representative = np.empty(m, dtype=np.int64)
+    flip = np.empty(m, dtype=np.bool_)
+
+    for selection, (strip_representative, strip_flip) in zip(arc_groups, _map(_group_strip, tasks, executor)):
+        representative[selection] = selection[strip_representative]
+        flip[selection] = strip_flip
+
+    arcs, refs = arc_references(representative, flip)
+
+    # Simplify and delta-encode distinct arcs
+
+    coords, offsets = arc_coordinates(quantized, parts, table, arcs)
+
+    if simplification > 0:
+        coords, offsets = simplify_coordinates(coords, offsets, simplification, processes)
+
+    ranges = _bounds(offsets, tiles)
+    tasks = [ (coords[ offsets[a]:offsets[b] ], offsets[ a:b+1 ] - offsets[a])
+              for a, b in zip(ranges[:-1], ranges[1:]) ]
+
+    encoded = list()
+    for chunk in _map(_delta_chunk, tasks, executor):
+        encoded.extend(chunk)
+
+    topo = {
+        'arcs': encoded,
+        'objects': map_geometries(refs, table, objects),
+        'bbox': bbox,
+        'type': 'Topology'
+    }
+
+    if transform is not None:
+        topo['transform'] = transform
+
+    return topo
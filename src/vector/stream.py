@@ -0,0 +1,302 @@
+# coding: utf-8
+""" Streaming GeoJSON to TopoJSON conversion.
+
+    Features are read one at a time, for example from newline-delimited
+    GeoJSON, and their coordinates are appended chunk by chunk
+    to growable typed arrays, quantized on the fly when the bounding box
+    is known beforehand. The resulting TopoJSON is written incrementally,
+    arc by arc and object by object.
+"""
+
+import numpy as np
+import json
+
+from topology import extract_geometry, quantize, build, delta_encode, map_geometries
+
+class GrowableArray(object):
+    """
+    Typed array with amortized constant-time append,
+    by doubling its capacity when full.
+
+    Parameters
+    ----------
+
+    dtype: numpy dtype
+
+    shape: tuple
+        Shape of each item
+
+    capacity: int
+        Initial number of items
+    """
+
+    def __init__(self, dtype, shape=(), capacity=1024):
+
+        self.buffer = np.empty((capacity,) + tuple(shape), dtype=dtype)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def extend(self, values):
+
+        values = np.asarray(values, dtype=self.buffer.dtype)
+        size = self.size + len(values)
+
+        if size > len(self.buffer):
+
+            buffer = np.empty((max(size, 2*len(self.buffer)),) + self.buffer.shape[1:], dtype=self.buffer.dtype)
+            buffer[ :self.size ] = self.buffer[ :self.size ]
+            self.buffer = buffer
+
+        self.buffer[ self.size:size ] = values
+        self.size = size
+
+    def array(self):
+        """
+        View of the items appended so far
+        """
+
+        return self.buffer[ :self.size ]
+
+def read_features(path):
+    """
+    Iterate over the features of a newline-delimited GeoJSON file,
+    one feature per line.
+    """
+
+    with open(path) as fp:
+        for line in fp:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def feature_bounds(features):
+    """
+    Bounding box [ minx, miny, maxx, maxy ] of an iterable of features,
+    computed in one pass.
+    """
+
+    bbox = [ np.inf, np.inf, -np.inf, -np.inf ]
+
+    def extract_part(line_coords):
+
+        coords = np.asarray(line_coords, dtype=np.float64)[ :, :2 ]
+        minx, miny = coords.min(axis=0)
+        maxx, maxy = coords.max(axis=0)
+        bbox[:] = [ min(bbox[0], minx), min(bbox[1], miny), max(bbox[2], maxx), max(bbox[3], maxy) ]
+
+    for feature in features:
+        extract_geometry(feature, extract_part, extract_part)
+
+    return bbox
+
+class StreamExtractor(object):
+    """
+    Incremental version of `topology.extract`,
+    fed one feature at a time.
+
+    Coordinates are collected in a small list of tuples,
+    flushed every `chunk_size` vertices to a growable array,
+    quantized if `bbox` is given.
+
+    Parameters
+    ----------
+
+    bbox: list [ minx, miny, maxx, maxy ] or None
+        Bounding box of all features
+
+    quantization: number
+        see `topology.topology`
+
+    chunk_size: int
+        Number of vertices per chunk
+
+    keep_objects: bool
+        Keep the extracted objects of all features
+        (without coordinates), see `topology.extract`
+    """
+
+    def __init__(self, bbox=None, quantization=1e6, chunk_size=1 << 16, keep_objects=True):
+
+        self.bbox = bbox
+        self.quantization = quantization
+        self.chunk_size = chunk_size
+        self.keep_objects = keep_objects
+
+        if bbox is not None and quantization > 1:
+            self.coordinates = GrowableArray(np.int32, (2,))
+        else:
+            self.coordinates = GrowableArray(np.float64, (2,))
+
+        self.parts = GrowableArray(np.int64, (2,))
+        self.ring = GrowableArray(np.bool_)
+        self.objects = list()
+        self.chunk = list()
+        self.size = 0
+
+    def extract_part(self, line_coords, is_ring):
+
+        a = self.size
+        self.chunk.extend(map(tuple, line_coords))
+        self.size += len(line_coords)
+
+        self.parts.extend([ (a, self.size - 1) ])
+        self.ring.extend([ is_ring ])
+
+        if len(self.chunk) >= self.chunk_size:
+            self.flush()
+
+        return len(self.parts) - 1
+
+    def extract_line(self, line_coords):
+        return self.extract_part(line_coords, False)
+
+    def extract_ring(self, line_coords):
+        return self.extract_part(line_coords, True)
+
+    def add(self, feature):
+
+        obj = extract_geometry(feature, self.extract_line, self.extract_ring)
+
+        if self.keep_objects:
+            self.objects.append(obj)
+
+    def flush(self):
+
+        if not self.chunk:
+            return
+
+        chunk = np.array(self.chunk, dtype=np.float64)[ :, :2 ]
+        self.chunk = list()
+
+        if self.bbox is not None:
+            chunk, _ = quantize(chunk, self.bbox, self.quantization)
+
+        self.coordinates.extend(chunk)
+
+def count_parts(feature, part):
+    """
+    Extract object of `feature`, numbering its parts from `part`,
+    without reading coordinates.
+
+    Returns
+    -------
+
+    obj: dict-like, see `topology.extract`
+
+    part: next part number
+    """
+
+    counter = [ part ]
+
+    def extract_part(line_coords):
+        counter[0] += 1
+        return counter[0] - 1
+
+    obj = extract_geometry(feature, extract_part, extract_part)
+
+    return obj, counter[0]
+
+def topology_stream(features, fp, quantization=1e6, simplification=0, bbox=None, chunk_size=1 << 16):
+    """
+    Convert a stream of GeoJSON features to TopoJSON,
+    written incrementally to a file.
+
+    The output is the same as `topology.topology` of a FeatureCollection
+    of the same features, when `bbox` is not given.
+
+    Parameters
+    ----------
+
+    features: iterable or callable
+        Iterable of GeoJSON features,
+        or function returning a new iterator over the same features,
+        eg. `functools.partial(read_features, path)`.
+        Given a function, features are read once more
+        to compute the bounding box if `bbox` is None,
+        and once more to write objects,
+        so that only vertices, and not features, are held in memory.
+
+    fp: file-like
+        Output TopoJSON
+
+    quantization: number, > 1
+        see `topology.topology`
+
+    simplification: float
+        see `topology.topology`
+
+    bbox: list [ minx, miny, maxx, maxy ]
+        Bounding box of all features.
+        When given, coordinates are quantized as they are read,
+        and stored as int32 instead of float64.
+
+    chunk_size: int
+        Number of vertices read between two flushes
+        to the coordinate array
+    """
+
+    rereadable = callable(features)
+
+    if rereadable and bbox is None and quantization > 1:
+        bbox = feature_bounds(features())
+
+    extractor = StreamExtractor(bbox, quantization, chunk_size, keep_objects=not rereadable)
+
+    for feature in (features() if rereadable else features):
+        extractor.add(feature)
+
+    extractor.flush()
+
+    coordinates = extractor.coordinates.array()
+    parts = extractor.parts.array()
+    ring = extractor.ring.array()
+
+    if bbox is None:
+        bbox = [ np.min(coordinates[:, 0]), np.min(coordinates[:, 1]),
+                 np.max(coordinates[:, 0]), np.max(coordinates[:, 1]) ]
+        coordinates, transform = quantize(coordinates, bbox, quantization)
+    else:
+        _, transform = quantize(np.zeros((0, 2)), bbox, quantization)
+
+    del extractor.coordinates
+
+    table, refs, coords, offsets = build(coordinates, parts, ring, simplification)
+
+    del coordinates
+
+    fp.write('{"type": "Topology", "bbox": %s, ' % json.dumps([ float(x) for x in bbox ]))
+
+    if transform is not None:
+        fp.write('"transform": %s, ' % json.dumps(transform))
+
+    fp.write('"arcs": [')
+
+    for i in range(len(offsets) - 1):
+
+        if i > 0:
+            fp.write(', ')
+
+        fp.write(json.dumps(delta_encode(coords[ offsets[i]:offsets[i+1] ].tolist())))
+
+    fp.write('], "objects": {"type": "FeatureCollection", "geometries": [')
+
+    if rereadable:
+        objects = features()
+    else:
+        objects = extractor.objects
+
+    part = 0
+
+    for i, obj in enumerate(objects):
+
+        if rereadable:
+            obj, part = count_parts(obj, part)
+
+        if i > 0:
+            fp.write(', ')
+
+        fp.write(json.dumps(map_geometries(refs, table, obj)))
+
+    fp.write(']}}')
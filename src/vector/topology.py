@@ -1,19 +1,70 @@
 # coding: utf-8
 
 import numpy as np
-from visvalingam import simplify
-from collections import defaultdict
+from visvalingam import simplify_arcs, batch_weights
+from collections import defaultdict, Mapping
+from itertools import chain
 from functools import partial
 import json
 
-class Arc(object):
+class ArcTable(object):
+    """
+    Arcs cut from lines and rings, as parallel integer arrays.
+
+    Arc vertices are given as a range of virtual positions
+    in the coordinate array of their part (line or ring).
+    Rings are rotated by an offset rather than by moving coordinates :
+    positions past the closing vertex b of a ring [a, b]
+    wrap around to a + 1, a + 2, ..., see `physical`.
+
+    Parameters
+    ----------
+
+    start, end: numpy-array, dtype int64
+        First and last virtual position of each arc
+
+    next: numpy-array, dtype int64
+        Index of the next arc of the same part, or -1
+
+    owner: numpy-array, dtype int64
+        Index of the part each arc is cut from
+
+    head: numpy-array, dtype int64
+        Index of the first arc of each part
+
+    anchored: numpy-array, dtype bool
+        True for parts starting at a junction, after rotation
+    """
+
+    def __init__(self, start, end, next, owner, head, anchored=None):
+
+        self.start = start
+        self.end = end
+        self.next = next
+        self.owner = owner
+        self.head = head
 
-    def __init__(self, index_a, index_b):
+        if anchored is None:
+            anchored = np.zeros(len(head), dtype=np.bool_)
 
-        self.a = index_a
-        self.b = index_b
-        self.next = None
-        self.count = 0
+        self.anchored = anchored
+
+    def __len__(self):
+        return len(self.start)
+
+    def chain(self, part):
+        """
+        Indexes of the arcs of `part`, in order
+        """
+
+        arcs = list()
+        arc = self.head[part]
+
+        while arc >= 0:
+            arcs.append(arc)
+            arc = self.next[arc]
+
+        return arcs
 
 def copy_key(instance, receiver, *keys):
 
@@ -22,632 +73,1462 @@ def copy_key(instance, receiver, *keys):
 
             receiver[key] = json.loads(json.dumps(instance[key]))
 
+def extract_geometry(component, extract_line, extract_ring):
+    """
+    Copy of GeoJSON object `component`,
+    where the coordinates of each line and ring are replaced
+    by the result of `extract_line` or `extract_ring`.
+    """
+
+    # TODO encode bbox, id fields
+
+    component_type = component['type']
+
+    if component_type == 'Point':
+        return {
+            'coordinates': list(component['coordinates']),
+            'type': component_type
+        }
+
+    elif component_type == 'LineString':
+        return {
+            'arcs': extract_line(component['coordinates']),
+            'type': component_type
+        }
+
+    elif component_type == 'Polygon':
+        return {
+            'arcs': map(extract_ring, component['coordinates']),
+            'type': component_type
+        }
+
+    elif component_type == 'MultiPoint':
+        return {
+            'coordinates': list(component['coordinates']),
+            'type': component_type
+        }
+
+    elif component_type == 'MultiLineString':
+        return {
+            'arcs': map(extract_line, component['coordinates']),
+            'type': component_type
+        }
+
+    elif component_type == 'MultiPolygon':
+        return {
+            'arcs': [ map(extract_ring, polygon) for polygon in component['coordinates'] ],
+            'type': component_type
+        }
+
+    elif component_type == 'GeometryCollection':
+        return {
+            'geometries': [ extract_geometry(geometry, extract_line, extract_ring)
+                            for geometry in component['geometries'] ],
+            'type': component_type
+        }
+
+    elif component_type == 'Feature':
+        geometry = extract_geometry(component['geometry'], extract_line, extract_ring)
+        copy_key(component, geometry, 'id', 'properties')
+        return geometry
+
+    elif component_type == 'FeatureCollection':
+        return {
+            'geometries': [ extract_geometry(feature, extract_line, extract_ring)
+                            for feature in component['features'] ],
+            'type': component_type
+        }
+
+    else:
+
+        raise ValueError('Unexpected type %s' % component_type)
+
 def extract(geojson):
     """
+    Flatten the coordinates of all lines and rings of a GeoJSON object.
+
+    Returns
+    -------
+
+    coordinates: numpy-array, shape (n, 2)
+
+    parts: numpy-array, shape (p, 2), dtype int64
+        First and last vertex index of each line or ring,
+        in coordinates
+
+    ring: numpy-array, shape (p,), dtype bool
+        True for parts that are closed rings
+
+    objects: dict-like
+        GeoJSON object, where coordinates of lines and rings
+        are replaced by part indexes
+
     [1] GeoJSON Specification
         https://tools.ietf.org/html/rfc7946
     """
 
     coordinates = list()
-    lines = list()
-    rings = list()
+    parts = list()
+    ring = list()
+
+    def extract_part(line_coords, is_ring):
+
+        a = len(coordinates)
+        coordinates.extend(map(tuple, line_coords))
+        b = len(coordinates) - 1
+
+        parts.append((a, b))
+        ring.append(is_ring)
+
+        return len(parts) - 1
+
+    extract_line = partial(extract_part, is_ring=False)
+    extract_ring = partial(extract_part, is_ring=True)
+
+    def extract_object(obj):
+        o = extract_geometry(obj, extract_line, extract_ring)
+        copy_key(obj, o, 'bbox', 'crs')
+        return o
+
+    if geojson.has_key('type'):
+
+        objects = extract_object(geojson)
+    else:
+        objects = { key: extract_object(obj) for key, obj in geojson.items() }
+
+    return np.array(coordinates), np.array(parts, dtype=np.int64).reshape(-1, 2), np.array(ring, dtype=np.bool_), objects
+
+def bounds(coordinates):
+    """
+    Bounding box [ minx, miny, maxx, maxy ] of coordinates
+    """
+
+    return [ np.min(coordinates[:, 0]), np.min(coordinates[:, 1]),
+             np.max(coordinates[:, 0]), np.max(coordinates[:, 1]) ]
+
+def quantize(coordinates, bbox, quantization):
+    """
+    Round off coordinates to a grid of size `quantization`
+    over bounding box `bbox`.
+
+    Returns
+    -------
+
+    quantized: numpy-array, shape (n, 2), dtype int32,
+        or coordinates if quantization <= 1
+
+    transform: dict-like TopoJSON transform,
+        or None if quantization <= 1
+    """
+
+    if quantization <= 1:
+        return coordinates, None
+
+    minx, miny, maxx, maxy = bbox
+    kx = (minx == maxx) and 1 or (maxx - minx)
+    ky = (miny == maxy) and 1 or (maxy - miny)
+
+    quantized = np.int32(np.round((coordinates - (minx, miny)) / (kx, ky) * quantization))
+
+    transform = {
+        'scale': [ kx / quantization, ky / quantization ],
+        'translate': [ minx, miny ]
+    }
+
+    return quantized, transform
+
+
+def index(coordinates):
+    """
+    Index of the first occurrence of each vertex coordinates.
+
+    Quantized integer coordinates are packed into a single int64 key
+    and grouped with `np.unique` ; other coordinates are grouped
+    with a stable lexicographic sort.
+
+    Parameters
+    ----------
+
+    coordinates: array-like, shape (n, 2)
+
+    Returns
+    -------
+
+    numpy-array, shape (n,), dtype int32,
+        index of the first vertex having the same coordinates
+        as each vertex
+    """
+
+    coordinates = np.asarray(coordinates)
+    n = len(coordinates)
+    dtype = np.int32 if n < 2**31 else np.int64
+
+    if n == 0:
+        return np.zeros(0, dtype=dtype)
+
+    x = coordinates[ :, 0 ]
+    y = coordinates[ :, 1 ]
+
+    if np.issubdtype(coordinates.dtype, np.integer) and coordinates.dtype.itemsize <= 4:
+
+        keys = (x.astype(np.int64) << 32) | (y.astype(np.int64) & 0xffffffff)
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+        return first[inverse].astype(dtype)
+
+    order = np.lexsort((y, x))
+    xs = x[order]
+    ys = y[order]
+    start = np.concatenate([ [ True ], (xs[1:] != xs[:-1]) | (ys[1:] != ys[:-1]) ])
+
+    # stable sort: the first vertex of each group has the lowest index
+    first = order[ np.maximum.accumulate(np.where(start, np.arange(n), 0)) ]
+
+    indexes = np.empty(n, dtype=dtype)
+    indexes[order] = first
+
+    return indexes
+
+def _ranges(starts, stops):
+    """
+    Concatenated integer ranges [start, stop) for each (start, stop) pair.
+
+    Returns
+    -------
+
+    positions: numpy-array, dtype int64
+        all values of the ranges, one range after the other
+
+    owner: numpy-array, dtype int64
+        index of the range each position belongs to
+    """
+
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.maximum(np.asarray(stops, dtype=np.int64) - starts, 0)
+    owner = np.repeat(np.arange(len(starts)), lengths)
+    positions = np.arange(len(owner)) - np.repeat(np.cumsum(lengths) - lengths, lengths) + starts[owner]
+
+    return positions, owner
+
+def neighbors(indexes, parts, ring):
+    """
+    (previous, current, next) triples of interior line vertices,
+    and of all ring vertices but the closing one,
+    whose previous vertex wraps around to the one before closing.
+
+    Parameters
+    ----------
+
+    indexes: array-like, shape (n,)
+        Index of first occurrence of each vertex, see `index`
+
+    parts, ring:
+        Lines and rings, see `extract`
+
+    Returns
+    -------
+
+    owner: numpy-array, dtype int64
+        Part of each triple
+
+    previous, current, following: numpy-array
+        Indexes of first occurrence of the vertices of each triple
+    """
+
+    a = parts[ :, 0 ]
+    b = parts[ :, 1 ]
+
+    positions, owner = _ranges(np.where(ring, a, a + 1), b)
+
+    previous = positions - 1
+    wrap = (positions == a[owner])
+    previous[wrap] = b[ owner[wrap] ] - 1
+
+    return owner, indexes[previous], indexes[positions], indexes[positions + 1]
+
+def junction_vertices(owner, previous, current, following):
+    """
+    Vertices of neighbor triples (see `neighbors`)
+    having more than one distinct unordered pair of neighbors,
+    only the first visit of a vertex by each part being considered.
+
+    Triples are sorted by vertex,
+    so that any subset of triples holding all the triples of its vertices
+    gives the same result for these vertices.
+
+    Returns
+    -------
+
+    numpy-array, index of first occurrence of junction vertices
+    """
+
+    # First visit of each vertex by each line or ring
+
+    order = np.lexsort((current, owner))
+    first = np.ones(len(order), dtype=np.bool_)
+    first[1:] = (owner[order[1:]] != owner[order[:-1]]) | (current[order[1:]] != current[order[:-1]])
+    order = order[first]
+
+    current = current[order]
+    low = np.minimum(previous[order], following[order])
+    high = np.maximum(previous[order], following[order])
+
+    # Vertices with more than one distinct unordered neighbor pair
+
+    order = np.lexsort((high, low, current))
+    current = current[order]
+    low = low[order]
+    high = high[order]
+
+    distinct = (current[1:] == current[:-1]) & ((low[1:] != low[:-1]) | (high[1:] != high[:-1]))
+
+    return np.unique(current[1:][distinct])
+
+def junction(coordinates, parts, ring, indexes=None):
+    """
+    Find junction vertices, ie. vertices where lines and rings
+    meet or split up.
+
+    A vertex is a junction if it is a line end point,
+    or if its (previous, next) neighbors differ, in either direction,
+    between two of the lines and rings passing through it.
+    Only the first visit of a vertex by each line or ring is considered.
+
+    Neighbor pairs are computed for all line and ring vertices at once,
+    as (previous, current, next) triples of indexes of first occurrence,
+    and the distinct pairs around each vertex are counted
+    by sorting triples.
+
+    Parameters
+    ----------
+
+    coordinates: array-like, shape (n, 2)
+
+    parts: array-like, shape (p, 2)
+        First and last vertex index of lines and rings in coordinates,
+        see `extract`
+
+    ring: array-like, shape (p,), dtype bool
+        True for parts that are closed rings
+
+    indexes: array-like, shape (n,), optional
+        Index of first occurrence of each vertex, see `index`
+
+    Returns
+    -------
+
+    numpy-array, shape (n,), dtype bool,
+        True for vertices whose coordinates are a junction
+    """
+
+    if indexes is None:
+        indexes = index(coordinates)
+
+    junctions = np.zeros(len(coordinates), dtype=np.bool_)
+
+    # Line end points are always junctions
+
+    junctions[ indexes[ parts[ ~ring, 0 ] ] ] = True
+    junctions[ indexes[ parts[ ~ring, 1 ] ] ] = True
+
+    junctions[ junction_vertices(*neighbors(indexes, parts, ring)) ] = True
+
+    return junctions[indexes]
+
+def physical(parts, owner, positions):
+    """
+    Coordinate index of virtual vertex positions
+    of arcs from parts `owner`, see `ArcTable`.
+    """
+
+    a = parts[ owner, 0 ]
+    b = parts[ owner, 1 ]
+
+    return np.where(positions > b, positions - (b - a), positions)
+
+def arc_positions(parts, table, arcs):
+    """
+    Coordinate indexes of the vertices of arcs `arcs`
+    of arc table `table`, one arc after the other.
+
+    Returns
+    -------
+
+    positions: numpy-array, dtype int64
+
+    offsets: numpy-array, shape (len(arcs) + 1,), dtype int64
+        Start of each arc in positions,
+        followed by the total number of positions
+    """
+
+    arcs = np.asarray(arcs, dtype=np.int64)
+    start = table.start[arcs]
+    end = table.end[arcs]
+
+    positions, k = _ranges(start, end + 1)
+    offsets = np.concatenate([ [ 0 ], np.cumsum(end + 1 - start) ])
+
+    return physical(parts, table.owner[arcs][k], positions), offsets
+
+def cut(coordinates, parts, ring, junctions=None):
+    """
+    Cut lines and rings into arcs at junctions,
+    given as a vertex mask, or found with `junction`.
+
+    A ring which does not start at a junction
+    is rotated to start at its first junction,
+    by shifting the virtual positions of its arcs.
+
+    Returns
+    -------
+
+    `ArcTable`, with the arcs of lines first and then the arcs of rings,
+    each part in order
+    """
+
+    if junctions is None:
+        junctions = junction(coordinates, parts, ring)
+
+    n = len(parts)
+    a = parts[ :, 0 ]
+    b = parts[ :, 1 ]
+
+    # Interior junctions of each part, in increasing position
+
+    interior, owner = _ranges(a + 1, b)
+    is_cut = junctions[interior]
+    interior = interior[is_cut]
+    owner = owner[is_cut]
+
+    parts_cut, first_cut = np.unique(owner, return_index=True)
+    shift = np.zeros(n, dtype=np.int64)
+    rotate = ring[parts_cut] & ~junctions[ a[parts_cut] ]
+    shift[ parts_cut[rotate] ] = interior[ first_cut[rotate] ] - a[ parts_cut[rotate] ]
+
+    # a rotated ring starts at its first junction
+    keep = (interior != a[owner] + shift[owner])
+    interior = interior[keep]
+    owner = owner[keep]
+
+    # Arc boundaries, sorted by part, lines first, and position
+
+    rank = np.empty(n, dtype=np.int64)
+    rank[ np.argsort(ring, kind='mergesort') ] = np.arange(n)
+
+    boundaries = np.concatenate([ a + shift, interior, b + shift ])
+    owner = np.concatenate([ np.arange(n), owner, np.arange(n) ])
+    order = np.lexsort((boundaries, rank[owner]))
+    boundaries = boundaries[order]
+    owner = owner[order]
+
+    same = (owner[1:] == owner[:-1])
+    start = boundaries[:-1][same]
+    end = boundaries[1:][same]
+    owner = owner[:-1][same]
+
+    m = len(start)
+    next_arc = np.arange(1, m+1, dtype=np.int64)
+    last = np.ones(m, dtype=np.bool_)
+    last[:-1] = (owner[1:] != owner[:-1])
+    next_arc[last] = -1
+
+    head = np.full(n, -1, dtype=np.int64)
+    first = np.ones(m, dtype=np.bool_)
+    first[1:] = last[:-1]
+    head[ owner[first] ] = np.flatnonzero(first)
+
+    anchored = junctions[a].copy()
+    anchored[ parts_cut[rotate] ] = True
+
+    return ArcTable(start, end, next_arc, owner, head, anchored)
+
+def _rank(coordinates):
+    """
+    Dense rank of each vertex in lexicographic (x, y) order,
+    equal coordinates having the same rank.
+    """
+
+    coordinates = np.asarray(coordinates)
+    n = len(coordinates)
+    order = np.lexsort((coordinates[ :, 1 ], coordinates[ :, 0 ]))
+    xs = coordinates[ order, 0 ]
+    ys = coordinates[ order, 1 ]
+
+    start = np.ones(n, dtype=np.bool_)
+    start[1:] = (xs[1:] != xs[:-1]) | (ys[1:] != ys[:-1])
+
+    ranks = np.empty(n, dtype=np.int64)
+    ranks[order] = np.cumsum(start) - 1
+
+    return ranks
+
+HASH_BASE = 0x100000001b3
+
+def arc_sequences(ranks, parts, ring, table):
+    """
+    Vertex rank sequence of every arc of `table`,
+    closing vertex excluded for rings left whole by `cut`.
+
+    A ring made of a single arc is whole
+    unless it starts at a junction :
+    it then reads as a loop, see `closed_arcs`,
+    and keeps its start vertex.
+
+    Parameters
+    ----------
+
+    ranks: array-like, shape (n,)
+        Rank of each vertex, see `_rank`
+
+    Returns
+    -------
+
+    whole: numpy-array, shape (len(table),), dtype bool
+        True for arcs that are whole rings,
+        not starting at a junction
+
+    length: numpy-array, dtype int64
+        Length of each sequence
+
+    sequences: numpy-array, dtype int64
+        Sequences of all arcs, one after the other
+    """
+
+    m = len(table)
+    arcs = np.arange(m)
+    owner = table.owner
+    whole = ring[owner] & (table.next < 0) & (table.head[owner] == arcs) & ~table.anchored[owner]
+
+    length = table.end - table.start + 1 - whole
+    positions, k = _ranges(table.start, table.start + length)
+
+    return whole, length, ranks[ physical(parts, owner[k], positions) ]
+
+def closed_arcs(sequences, length, whole):
+    """
+    Arcs compared up to rotation, see `fingerprint` :
+    rings left whole by `cut`, and loops,
+    ie. other arcs starting and ending at the same vertex,
+    whose closing vertex is dropped.
+
+    Returns
+    -------
+
+    closed: numpy-array, dtype bool
+        True for whole rings and loops
+
+    loop: numpy-array, dtype bool
+        True for loops
+
+    length: numpy-array, dtype int64
+        Length of each sequence, without the closing vertex of loops
+
+    sequences: numpy-array, dtype int64
+    """
+
+    start = np.cumsum(length) - length
+    last = start + length - 1
+
+    loop = ~whole & (length > 1)
+    loop[loop] = (sequences[ start[loop] ] == sequences[ last[loop] ])
+
+    keep = np.ones(len(sequences), dtype=np.bool_)
+    keep[ last[loop] ] = False
+
+    return whole | loop, loop, length - loop, sequences[keep]
+
+def fingerprint(sequences, length, closed):
+    """
+    Orientation- and rotation-invariant fingerprint of every arc.
+
+    Each arc is read in canonical order, as a sequence of vertex ranks
+    (see `arc_sequences`) :
+
+    - closed arcs, closing vertex excluded (see `closed_arcs`),
+      are read from their first minimum vertex ;
+
+    - and all arcs are read in the lexicographically smaller
+      of their two directions.
+
+    The fingerprint is a polynomial hash, modulo 2**64,
+    of the canonical sequence, computed for all arcs at once.
+
+    Returns
+    -------
+
+    hashes: numpy-array, dtype uint64
+        Hash of each canonical sequence
+
+    flip: numpy-array, dtype bool
+        True for arcs whose canonical direction is reversed
+
+    canonical: numpy-array, dtype int64
+        Canonical sequences of all arcs, one after the other
+    """
+
+    m = len(length)
+    start = np.cumsum(length) - length
+    k = np.repeat(np.arange(m), length)
+    j = np.arange(len(k)) - start[k]
+    n = length[k]
+
+    # Rotate closed arcs to their first minimum vertex
+
+    rotation = np.zeros(m, dtype=np.int64)
+    in_ring = closed[k]
+    order = np.lexsort((j[in_ring], sequences[in_ring], k[in_ring]))
+    ring_arcs, first = np.unique(k[in_ring][order], return_index=True)
+    rotation[ring_arcs] = j[in_ring][order][first]
+    o = rotation[k]
+
+    forward = sequences[ start[k] + np.where(in_ring, (o + j) % np.maximum(n, 1), j) ]
+    reverse = sequences[ start[k] + np.where(in_ring, (o - j) % np.maximum(n, 1), n - 1 - j) ]
+
+    # Direction from the first difference between both readings
+
+    differ = np.flatnonzero(forward != reverse)
+    flip = np.zeros(m, dtype=np.bool_)
+    differ_arcs, first = np.unique(k[differ], return_index=True)
+    flip[differ_arcs] = forward[differ[first]] > reverse[differ[first]]
+
+    canonical = np.where(flip[k], reverse, forward)
+
+    # Polynomial hash, with wrap-around uint64 arithmetic
+
+    powers = np.full(max(length.max(), 1) if m else 1, HASH_BASE, dtype=np.uint64)
+    powers[0] = 1
+    powers = np.cumprod(powers)
+
+    terms = (canonical.astype(np.uint64) + np.uint64(1)) * powers[ n - 1 - j ]
+    hashes = np.zeros(m, dtype=np.uint64)
+    nonempty = (length > 0)
+    if np.any(nonempty):
+        hashes[nonempty] = np.add.reduceat(terms, start[nonempty])
+
+    return hashes, flip, canonical
+
+def group_arcs(sequences, length, whole):
+    """
+    Group equal arcs, see `dedup`.
+
+    Arcs are grouped by fingerprint (see `fingerprint`)
+    and anchor vertex, and compared to the first arc of their group ;
+    arcs are compared pairwise only within groups
+    where fingerprints collide.
+
+    Closed arcs (see `closed_arcs`) are compared up to rotation,
+    but loops keep their start vertex, which is their anchor ;
+    other arcs are anchored at their first canonical vertex.
+
+    Equal arcs having the same anchor,
+    any subset of arcs holding all the arcs
+    with a given anchor gives the same result for these arcs.
+
+    Returns
+    -------
+
+    representative: numpy-array, dtype int64
+        Index of the first arc equal to each arc
+
+    flip: numpy-array, dtype bool
+        see `fingerprint`
+    """
+
+    m = len(length)
+    closed, loop, length, sequences = closed_arcs(sequences, length, whole)
+    hashes, flip, canonical = fingerprint(sequences, length, closed)
+    start = np.cumsum(length) - length
+
+    anchor = np.full(m, -1, dtype=np.int64)
+    nonempty = (length > 0)
+    anchor[nonempty] = np.where(loop, sequences[ np.minimum(start, len(sequences) - 1) ],
+                                canonical[ np.minimum(start, len(canonical) - 1) ])[nonempty]
+
+    order = np.lexsort((np.arange(m), hashes, anchor, length, closed))
+    new_group = np.ones(m, dtype=np.bool_)
+    new_group[1:] = (closed[order[1:]] != closed[order[:-1]]) | \
+                    (length[order[1:]] != length[order[:-1]]) | \
+                    (anchor[order[1:]] != anchor[order[:-1]]) | \
+                    (hashes[order[1:]] != hashes[order[:-1]])
+    group = np.cumsum(new_group) - 1
+
+    representative = np.empty(m, dtype=np.int64)
+    representative[order] = order[ np.flatnonzero(new_group)[group] ]
+
+    # Check canonical sequences against the first arc of the group
+
+    k = np.repeat(np.arange(m), length)
+    j = np.arange(len(k)) - start[k]
+    mismatch = canonical != canonical[ start[ representative[k] ] + j ]
+    collision = np.zeros(m, dtype=np.bool_)
+    collision[ k[mismatch] ] = True
+
+    group_of = np.empty(m, dtype=np.int64)
+    group_of[order] = group
+
+    for g in np.unique(group_of[collision]):
+
+        representatives = list()
+
+        for arc in order[ group == g ]:
+
+            sequence = canonical[ start[arc]:start[arc]+length[arc] ]
+
+            for other in representatives:
+                if np.array_equal(sequence, canonical[ start[other]:start[other]+length[other] ]):
+                    representative[arc] = other
+                    break
+            else:
+                representatives.append(arc)
+                representative[arc] = arc
+
+    return representative, flip
+
+def arc_references(representative, flip):
+    """
+    Distinct arcs and signed references of all arcs,
+    given the first arc equal to each arc, see `group_arcs`
+    """
+
+    m = len(representative)
+    arcs = np.flatnonzero(representative == np.arange(m))
+    number = np.zeros(m, dtype=np.int64)
+    number[arcs] = np.arange(1, len(arcs) + 1)
+    refs = number[representative] * np.where(flip == flip[representative], 1, -1)
+
+    return arcs, refs
+
+def dedup(coordinates, parts, ring, table, ranks=None):
+    """
+    Find duplicate arcs, in either direction,
+    rings left whole by `cut` and loops being compared up to rotation,
+    see `group_arcs`.
+
+    Returns
+    -------
+
+    arcs: numpy-array, dtype int64
+        Index in `table` of each distinct arc, in order of first occurrence
+
+    refs: numpy-array, shape (len(table),), dtype int64
+        Reference of each arc of `table` to distinct arc i,
+        i + 1, or -(i + 1) if reversed
+    """
+
+    if ranks is None:
+        ranks = _rank(coordinates)
+
+    whole, length, sequences = arc_sequences(ranks, parts, ring, table)
+    representative, flip = group_arcs(sequences, length, whole)
+
+    return arc_references(representative, flip)
+
+def arc_coordinates(coordinates, parts, table, arcs):
+    """
+    Vertices of arcs `arcs` of arc table `table`,
+    one arc after the other.
+
+    Returns
+    -------
+
+    coordinates: numpy-array, shape (m, 2)
+
+    offsets: numpy-array, shape (len(arcs) + 1,), dtype int64
+        Start of each arc in coordinates,
+        followed by the total number of vertices
+    """
+
+    positions, offsets = arc_positions(parts, table, arcs)
+    return coordinates[positions], offsets
+
+def delta_encode(coordinates):
+
+    x0, y0 = coordinates[0]
+    delta_coords = [[ x0, y0 ]]
+
+    for x, y in coordinates[1:]:
+
+        if not (x == x0 and y == y0):
+            delta_coords.append([ x - x0, y - y0 ])
+            x0 = x
+            y0 = y
+    
+    if len(delta_coords) == 1:
+        delta_coords.append([ 0, 0 ])
+
+    return delta_coords
+
+def delta_decode(delta_coords):
+
+    x, y = delta_coords[0]
+    coordinates = [[ x, y ]]
+
+    for dx, dy in delta_coords[1:]:
+        x = x + dx
+        y = y + dy
+        coordinates.append([ x, y ])
+
+    return coordinates
+
+
+def delta(coordinates, offsets):
+
+    return [ delta_encode(coordinates[ a:b ].tolist())
+             for a, b in zip(offsets[:-1], offsets[1:]) ]
+
+def map_arcs(objects, map_arc):
+    """
+    Replace, in place, each line or ring of TopoJSON-like `objects`,
+    ie. the leaf lists of 'arcs' fields, by `map_arc(line)`.
+    """
+
+    def component_arcs(component):
+
+        component_type = component['type']
+
+        if component_type == 'Point':
+            pass
+
+        elif component_type == 'LineString':
+            component['arcs'] = map_arc(component['arcs'])
+
+        elif component_type == 'Polygon':
+            component['arcs'] = map(map_arc, component['arcs'])
+
+        elif component_type == 'MultiPoint':
+            pass
+
+        elif component_type == 'MultiLineString':
+            component['arcs'] = map(map_arc, component['arcs'])
+
+        elif component_type == 'MultiPolygon':
+            component['arcs'] = [ map(map_arc, polygon) for polygon in component['arcs'] ]
+
+        elif component_type == 'GeometryCollection' or component_type == 'FeatureCollection':
+            for geometry in component['geometries']:
+                component_arcs(geometry)
+
+        elif component_type == 'Feature':
+            component_arcs(component['geometry'])
+
+        return component
+
+    if objects.has_key('type'):
+        
+        component_arcs(objects)
 
-    def extract_line(line_coords):
+    else:
 
-        a = len(coordinates)
-        coordinates.extend(map(tuple, line_coords))
-        b = len(coordinates) - 1
+        return { key: component_arcs(obj) for key, obj in objects.items() }
 
-        arc = Arc(a, b)
-        lines.append(arc)
+    return objects
 
-        return arc
+def map_geometries(refs, table, objects):
 
-    def extract_ring(line_coords):
+    def map_arc(part):
 
-        a = len(coordinates)
-        coordinates.extend(map(tuple, line_coords))
-        b = len(coordinates) - 1
+        return refs[ table.chain(part) ].tolist()
 
-        arc = Arc(a, b)
-        rings.append(arc)
+    return map_arcs(objects, map_arc)
 
-        return arc
+def simplify_coordinates(coordinates, offsets, simplification, processes=1):
+    """
+    Remove vertices of Visvalingam weight below `simplification`
+    from arcs given as coordinates and offsets, see `arc_coordinates`.
 
-    def extract_geometry(component):
+    Returns
+    -------
 
-        # TODO encode bbox, id fields
+    Simplified coordinates and offsets
+    """
 
-        component_type = component['type']
+    keep = simplify_arcs(coordinates, offsets, simplification, processes)
+    offsets = np.concatenate([ [ 0 ], np.cumsum(keep) ])[offsets]
 
-        if component_type == 'Point':
-            return {
-                'coordinates': list(component['coordinates']),
-                'type': component_type
-            }
+    return coordinates[keep], offsets
 
-        elif component_type == 'LineString':
-            return {
-                'arcs': extract_line(component['coordinates']),
-                'type': component_type
-            }
+def build(coordinates, parts, ring, simplification=0):
+    """
+    Cut lines and rings into arcs, deduplicate arcs
+    and simplify distinct arcs.
 
-        elif component_type == 'Polygon':
-            return {
-                'arcs': map(extract_ring, component['coordinates']),
-                'type': component_type
-            }
+    Parameters
+    ----------
 
-        elif component_type == 'MultiPoint':
-            return {
-                'coordinates': list(component['coordinates']),
-                'type': component_type
-            }
+    coordinates, parts, ring:
+        Vertices of lines and rings, see `extract`,
+        quantized, see `quantize`
 
-        elif component_type == 'MultiLineString':
-            return {
-                'arcs': map(extract_line, component['coordinates']),
-                'type': component_type
-            }
+    simplification: float
+        Minimum Visvalingam weight of vertices to keep,
+        0 for no simplification
 
-        elif component_type == 'MultiPolygon':
-            return {
-                'arcs': [ map(extract_ring, polygon) for polygon in component['coordinates'] ],
-                'type': component_type
-            }
+    Returns
+    -------
 
-        elif component_type == 'GeometryCollection':
-            return {
-                'geometries': map(extract_geometry, component['geometries']),
-                'type': component_type
-            }
+    table: `ArcTable`
 
-        elif component_type == 'Feature':
-            geometry = extract_geometry(component['geometry'])
-            copy_key(component, geometry, 'id', 'properties')
-            return geometry
+    refs: numpy-array, dtype int64
+        Reference of each arc of table to its distinct arc, see `dedup`
 
-        elif component_type == 'FeatureCollection':
-            return {
-                'geometries': map(extract_geometry, component['features']),
-                'type': component_type
-            }
+    coords: numpy-array, shape (m, 2)
+        Vertices of distinct arcs, one after the other
 
-        else:
+    offsets: numpy-array, dtype int64
+        Start of each distinct arc in coords,
+        followed by the total number of vertices
+    """
 
-            raise ValueError('Unexpected type %s' % component_type)
+    table = cut(coordinates, parts, ring)
+    arcs, refs = dedup(coordinates, parts, ring, table)
+    coords, offsets = arc_coordinates(coordinates, parts, table, arcs)
 
-    def extract_object(obj):
-        o = extract_geometry(obj)
-        copy_key(obj, o, 'bbox', 'crs')
-        return o
+    if simplification > 0:
+        coords, offsets = simplify_coordinates(coords, offsets, simplification)
 
-    if geojson.has_key('type'):
+    return table, refs, coords, offsets
 
-        objects = extract_object(geojson)
-    else:
-        objects = { key: extract_object(obj) for key, obj in geojson.items() }
+def distinct_consecutive(coordinates, offsets):
+    """
+    Drop vertices equal to the previous vertex of their arc,
+    as `delta_encode` does.
 
-    return np.array(coordinates), lines, rings, objects
+    Returns
+    -------
 
+    Coordinates and offsets, see `arc_coordinates`
+    """
 
+    n = len(coordinates)
+    keep = np.ones(n, dtype=np.bool_)
 
-def index(coordinates):
+    if n > 1:
+        keep[1:] = np.any(coordinates[1:] != coordinates[:-1], axis=1)
+        keep[ offsets[:-1][ offsets[:-1] < n ] ] = True
 
-    coordinates_map = dict()
-    indexes = np.full(len(coordinates), -1, dtype=np.int32)
+    offsets = np.concatenate([ [ 0 ], np.cumsum(keep) ])[offsets]
 
-    for i in xrange(len(coordinates)):
+    return coordinates[keep], offsets
 
-        c = tuple(coordinates[i])
-        if coordinates_map.has_key(c):
-            indexes[i] = coordinates_map[c]
-        else:
-            indexes[i] = i
-            coordinates_map[c] = i
+def presimplify_arcs(coordinates, offsets):
+    """
+    Visvalingam weights of arc vertices, see `visvalingam.batch_weights`,
+    for a topology simplified later at any threshold, see `simplify_topology`.
 
-    del coordinates_map
+    Vertices equal to the previous vertex of their arc are dropped first,
+    so that weights match the delta-encoded arcs vertex for vertex.
 
-    return indexes
+    Returns
+    -------
 
-def junction(coordinates, lines, rings):
+    coordinates, offsets:
+        Arcs without repeated vertices
 
-    n = len(coordinates)
+    weights: list of lists
+        Weights of interior vertices of each arc,
+        end points being always kept
+    """
 
-    indexes = index(coordinates)
-    visited = np.full(n, -1, dtype=np.int32)
-    left = np.full(n, -1, dtype=np.int32)
-    right = np.full(n, -1, dtype=np.int32)
-    junctions = np.zeros(n, dtype=np.int16)
-    junction_count = 0
+    coordinates, offsets = distinct_consecutive(coordinates, offsets)
+    weights = batch_weights(coordinates, offsets)
 
-    def sequence(i, previous_index, current_index, next_index):
+    return coordinates, offsets, [ weights[ a+1:b-1 ].tolist() for a, b in zip(offsets[:-1], offsets[1:]) ]
 
-        if visited[current_index] == i:
-            return 0
+def topology(geojson, quantization=1e6, simplification=0, presimplify=False, spatial_index=False):
+    """
+    Convert GeoJSON to TopoJSON.
 
-        visited[current_index] = i
-        left_index = left[current_index]
-        count = 0
+    Parameters
+    ----------
 
-        if left_index >= 0:
+    geojson: dict-like
+        plain GeoJSON object
+        or dictionary of named GeoJSON objects
 
-            right_index = right[current_index]
+    quantization: number, > 1
+        size of the grid used to round-off coordinates.
+        If <= 1, no quantization is used.
 
-            if (left_index != previous_index or right_index != next_index) and \
-               (left_index != next_index or right_index != previous_index):
+    simplification: float
+        Minimum Visvalingam weight of vertices to keep,
+        in quantized units, 0 for no simplification
 
-               junctions[current_index] = 1
-               count += 1
+    presimplify: bool
+        If True, store the Visvalingam weight of arc vertices
+        in a 'weights' member, see `presimplify_arcs`,
+        to be simplified later by `simplify_topology`
 
-        else:
+    spatial_index: bool
+        If True, store packed R-trees over arcs and objects
+        in an 'index' member, see `packed_rtree.spatial_index`,
+        for bounding box queries, see `packed_rtree.TopologyIndex`
 
-            left[current_index] = previous_index
-            right[current_index] = next_index
+    Returns
+    -------
 
-        return count
+    topojson: dict-like TopoJSON object
 
-    for i, line in enumerate(lines):
+    Notes
+    -----
 
-        start = line.a
-        end = line.b
-        current_index = indexes[start]
-        next_index = indexes[start + 1]
+    [1] Bostock, Mike (2013) How To Infer Topology
+        https://bost.ocks.org/mike/topology/
 
-        start += 1
-        junctions[current_index] = 1
-        junction_count += 1
+    [2] Bostock's Nodejs reference implementation
+        https://github.com/topojson/topojson-server/tree/6c1709b/src
+        BSD-3 Licensed
+    """
 
-        while start < end:
+    coordinates, parts, ring, objects = extract(geojson)
 
-            start += 1
-            previous_index = current_index
-            current_index = next_index
-            next_index = indexes[start]
-            junction_count += sequence(i, previous_index, current_index, next_index)
+    bbox = bounds(coordinates)
+    quantized, transform = quantize(coordinates, bbox, quantization)
+    table, refs, coords, offsets = build(quantized, parts, ring, simplification)
 
-        junctions[next_index] = 1
-        junction_count += 1
+    if presimplify:
+        coords, offsets, weights = presimplify_arcs(coords, offsets)
 
-    visited = np.full(n, -1, dtype=np.int32)
+    topo = {
+        'arcs': delta(coords, offsets),
+        'objects': map_geometries(refs, table, objects),
+        'bbox': bbox,
+        'type': 'Topology'
+    }
 
-    for i, ring in enumerate(rings):
+    if transform is not None:
+        topo['transform'] = transform
 
-        start = ring.a
-        end = ring.b
+    if presimplify:
+        topo['weights'] = weights
 
-        previous_index = indexes[end - 1]
-        current_index = indexes[start]
-        next_index = indexes[start + 1]
+    if spatial_index:
+        import packed_rtree
+        topo['index'] = packed_rtree.spatial_index(coords, offsets, topo['objects'], transform)
 
-        start += 1
-        junction_count += sequence(i, previous_index, current_index, next_index)
+    return topo
 
-        while start < end:
+GEOMETRY_TYPES = {
+    'linestring': 'LineString',
+    'multilinestring': 'MultiLineString',
+    'polygon': 'Polygon',
+    'multipolygon': 'MultiPolygon'
+}
 
-            start += 1
-            previous_index = current_index
-            current_index = next_index
-            next_index = indexes[start]
-            junction_count += sequence(i, previous_index, current_index, next_index)
+def topology_arrays(geometry_type, coordinates, offsets, ids=None, properties=None, quantization=1e6, simplification=0):
+    """
+    Convert columnar geometries to TopoJSON,
+    in the ragged array layout of `shapely.to_ragged_array` and GeoArrow :
+    one flat coordinate array, and offset arrays
+    from the innermost level (lines, rings) to geometries.
 
-    # del visited
-    # del left
-    # del right
+    The result is the same as `topology` of the equivalent
+    GeoJSON FeatureCollection, without building or parsing it.
 
-    junction_set = { tuple(coordinates[indexes[i]])
-                     for i in range(n)
-                     if junctions[indexes[i]] == 1 }
+    `shapely.to_ragged_array` requires shapely >= 2.0,
+    which only runs on Python 3, while this module is Python 2 :
+    arrays from shapely or GeoArrow must be produced by another process,
+    and passed here, eg. as .npy files.
 
-    # junction_set = set()
-    # for i in range(n):
+    Parameters
+    ----------
 
-    #     j = indexes[i]
-    #     if junctions[j] == 1:
-    #         junction_set.add(coordinates[j])
+    geometry_type: str, or enum with a `name`, eg. shapely.GeometryType
+        LineString, MultiLineString, Polygon or MultiPolygon,
+        the same for all geometries
 
-    # del indexes
-    # del junctions
+    coordinates: array-like, shape (n, 2) or more columns
+        Vertices of all lines or rings, one after the other,
+        rings being closed; extra columns (z) are ignored
 
-    return junction_set
+    offsets: tuple of array-like
+        - LineString: (line offsets into coordinates,)
+        - MultiLineString: (line offsets into coordinates, geometry offsets into lines)
+        - Polygon: (ring offsets into coordinates, geometry offsets into rings)
+        - MultiPolygon: (ring offsets into coordinates, polygon offsets into rings,
+          geometry offsets into polygons)
 
-def rotate(x, start, mid, end):
+    ids: array-like, optional
+        Feature id of each geometry
 
-    # ABCDE -> EDCBA -> CDEAB
-    # x[ start:end+1 ] = np.flip(x[ start:end+1 ], 0)
-    # x[ start:mid ] = np.flip(x[ start:mid ], 0)
-    # x[ mid:end+1 ] = np.flip(x[ mid:end+1 ], 0)
+    properties: list of dict-like, optional
+        Feature properties of each geometry
 
-    x[ start:end+1 ] = np.roll(x[ start:end+1 ], end-mid+1, 0)
+    quantization, simplification:
+        see `topology`
 
-def cut(coordinates, lines, rings):
+    Returns
+    -------
 
-    junctions = junction(coordinates, lines, rings)
+    topojson: dict-like TopoJSON object
+    """
 
-    for line in lines:
+    geometry_type = str(getattr(geometry_type, 'name', geometry_type)).lower()
 
-        start = mid = line.a
-        end = line.b
+    if geometry_type not in GEOMETRY_TYPES:
+        raise ValueError('Unexpected type %s' % geometry_type)
 
-        while mid < end-1:
-            mid += 1
-            if tuple(coordinates[mid]) in junctions:
-                line.b = mid
-                line.next = Arc(mid, end)
-                line = line.next
+    component_type = GEOMETRY_TYPES[geometry_type]
+    coordinates = np.asarray(coordinates)[ :, :2 ]
+    offsets = [ np.asarray(offset, dtype=np.int64) for offset in offsets ]
 
-    for ring in rings:
+    # Lines and rings, from the innermost offsets
 
-        start = mid = ring.a
-        end = ring.b
-        ring_fixed = (tuple(coordinates[start]) in junctions)
+    parts = np.column_stack([ offsets[0][:-1], offsets[0][1:] - 1 ])
+    ring = np.full(len(parts), component_type.endswith('Polygon'), dtype=np.bool_)
 
-        while mid < end-1:
-            mid += 1
-            if tuple(coordinates[mid]) in junctions:
-                if ring_fixed:
-                    ring.b = mid
-                    ring.next = Arc(mid, end)
-                    ring = ring.next
-                else:
-                    rotate(coordinates, start, mid, end-1)
-                    coordinates[end] = coordinates[start]
-                    ring_fixed = True
-                    mid = start
+    bbox = bounds(coordinates)
+    quantized, transform = quantize(coordinates, bbox, quantization)
+    table, refs, coords, arc_offsets = build(quantized, parts, ring, simplification)
 
-def count_lines(lines):
+    # Objects, from the outermost offsets
 
-    count = 0
+    if component_type == 'LineString':
+        geometries = [ { 'arcs': part } for part in range(len(parts)) ]
 
-    for i in range(len(lines)):
+    elif component_type == 'MultiLineString' or component_type == 'Polygon':
+        groups = offsets[1].tolist()
+        geometries = [ { 'arcs': range(start, end) } for start, end in zip(groups[:-1], groups[1:]) ]
 
-        line = lines[i]
-        while line.next:
-            line = line.next
-            count += 1
-        count += 1
+    else:
+        polygons = offsets[1].tolist()
+        groups = offsets[2].tolist()
+        geometries = [ { 'arcs': [ range(polygons[q], polygons[q+1]) for q in range(start, end) ] }
+                       for start, end in zip(groups[:-1], groups[1:]) ]
 
-    return count
+    if ids is not None:
+        ids = np.asarray(ids).tolist()
 
-def dedup(coordinates, lines, rings):
+    for i, geometry in enumerate(geometries):
 
-    arc_index = defaultdict(list)
-    arcs = list()
+        geometry['type'] = component_type
 
-    def minimum_offset(arc):
+        if ids is not None and ids[i]:
+            geometry['id'] = ids[i]
 
-        mid = arc.a
-        minimum = mid
-        minimum_point = coordinates[mid]
+        if properties is not None:
+            copy_key({ 'properties': properties[i] }, geometry, 'properties')
 
-        while mid < arc.b-1:
-            mid += 1
-            point = coordinates[mid]
-            if point[0] < minimum_point[0] or point[0] == minimum_point[0] and point[1] < minimum_point[1]:
-                minimum = mid
-                minimum_point = point
+    objects = {
+        'geometries': geometries,
+        'type': 'FeatureCollection'
+    }
 
-        return minimum - arc.a
+    topo = {
+        'arcs': delta(coords, arc_offsets),
+        'objects': map_geometries(refs, table, objects),
+        'bbox': bbox,
+        'type': 'Topology'
+    }
 
-    def equal_line(x, y):
+    if transform is not None:
+        topo['transform'] = transform
 
-        n = x.b - x.a
-        if n != (y.b - y.a):
-            return False
+    return topo
 
-        return np.all([ coordinates[ x.a + i ] == coordinates[ y.a + i ] for i in range(n+1) ])
+def flatten_arcs(arcs):
+    """
+    Delta-encoded TopoJSON arcs as one array.
 
-    def equal_line_reverse(x, y):
+    Returns
+    -------
 
-        n = x.b - x.a
-        if n != (y.b - y.a):
-            return False
+    deltas: numpy-array, shape (m, 2)
+        Vertices of all arcs, one arc after the other
 
-        return np.all([ coordinates[ x.a + i ] == coordinates[ y.b - i ]
-                     for i in range(n+1) ])
+    offsets: numpy-array, dtype int64
+        Start of each arc in deltas,
+        followed by the total number of vertices
+    """
 
-    def equal_ring(x, y):
+    offsets = np.concatenate([ [ 0 ], np.cumsum([ len(arc) for arc in arcs ], dtype=np.int64) ])
+    deltas = np.array(list(chain.from_iterable(arcs))).reshape(-1, 2)
 
-        n = x.b - x.a
-        if n != (y.b - y.a):
-            return False
+    return deltas, offsets
 
-        offset_x = minimum_offset(x)
-        offset_y = minimum_offset(y)
+def decode_arcs(deltas, offsets, transform=None):
+    """
+    Absolute coordinates of delta-encoded arcs,
+    with the TopoJSON `transform` applied as one array operation.
 
-        return np.all([ coordinates[ x.a + ((i + offset_x) % n) ] == coordinates[ y.a + ((i + offset_y) % n) ]
-                     for i in range(n+1) ])
+    Integer deltas are decoded with a single cumulative sum over all arcs,
+    minus the running total at the start of each arc ;
+    floating point deltas with one cumulative sum per arc,
+    which adds them up in the same order as `delta_decode`.
 
-    def equal_ring_reverse(x, y):
+    Parameters
+    ----------
 
-        n = x.b - x.a
-        if n != (y.b - y.a):
-            return False
+    deltas: array-like, shape (m, 2)
+        Vertices of all arcs, the first vertex of each arc being absolute
 
-        offset_x = minimum_offset(x)
-        offset_y = n - minimum_offset(y)
+    offsets: array-like, dtype int
+        Start of each arc in deltas,
+        followed by the total number of vertices
 
-        return np.all([ coordinates[ x.a + ((i + offset_x) % n) ] == coordinates[ y.b - ((i + offset_y) % n) ]
-                     for i in range(n+1) ])
+    transform: dict-like TopoJSON transform, optional
 
-    def dedup_line(arc):
+    Returns
+    -------
 
-        for other_arc in arc_index[tuple(coordinates[arc.a])]:
-            if equal_line(arc, other_arc):
-                arc.a = other_arc.a
-                arc.b = other_arc.b
-                return
+    List of numpy-arrays, shape (k, 2)
+    """
 
-        for other_arc in arc_index[tuple(coordinates[arc.b])]:
-            if equal_line_reverse(arc, other_arc):
-                arc.a = other_arc.b
-                arc.b = other_arc.a
-                return
+    offsets = np.asarray(offsets, dtype=np.int64)
 
-        arc_index[tuple(coordinates[arc.a])].append(arc)
-        arc_index[tuple(coordinates[arc.b])].append(arc)
-        
-        arcs.append(arc)
-
-    def dedup_ring(arc):
-
-        for other_arc in arc_index[tuple(coordinates[arc.a])]:
-            if equal_line(arc, other_arc):
-                arc.a = other_arc.a
-                arc.b = other_arc.b
-                return
-            if equal_line_reverse(arc, other_arc):
-                arc.a = other_arc.b
-                arc.b = other_arc.a
-                return
-
-        offset = minimum_offset(arc)
-
-        for other_arc in arc_index[tuple(coordinates[arc.a + offset])]:
-            if equal_ring(arc, other_arc):
-                arc.a = other_arc.a
-                arc.b = other_arc.b
-                return
-            if equal_ring_reverse(arc, other_arc):
-                arc.a = other_arc.b
-                arc.b = other_arc.a
-                return
-            
-        arc_index[tuple(coordinates[arc.a + offset])].append(arc)
+    if len(offsets) < 2:
+        return list()
 
-        arcs.append(arc)
+    coordinates = _absolute(deltas, offsets)
 
-    for line in lines:
-        while line:
-            dedup_line(line)
-            line = line.next
+    if transform:
+        coordinates = coordinates * transform['scale'] + transform['translate']
 
-    for ring in rings:
-        if ring.next:
-            while ring:
-                dedup_line(ring)
-                ring = ring.next
-        else:
-            dedup_ring(ring)
+    return np.split(coordinates, offsets[1:-1])
 
-    return arcs
+def _absolute(deltas, offsets):
+    """ Absolute coordinates of delta-encoded arcs,
+    as one array, see `decode_arcs`
+    """
 
-def arc_geometry(coordinates, arc):
+    if np.issubdtype(deltas.dtype, np.integer):
 
-    a = arc.a
-    b = arc.b
+        total = np.cumsum(deltas, axis=0, dtype=np.int64)
+        start = offsets[:-1]
+        base = np.zeros((len(start), 2), dtype=np.int64)
+        base[ start > 0 ] = total[ start[ start > 0 ] - 1 ]
+        coordinates = total - np.repeat(base, np.diff(offsets), axis=0)
 
-    if a > b:
-        return np.flip(coordinates[b:a+1], 0).tolist()
     else:
-        return coordinates[a:b+1].tolist()
-
-def delta_encode(coordinates):
 
-    x0, y0 = coordinates[0]
-    delta_coords = [[ x0, y0 ]]
+        coordinates = np.empty(deltas.shape, dtype=np.float64)
+        for a, b in zip(offsets[:-1], offsets[1:]):
+            np.cumsum(deltas[ a:b ], axis=0, out=coordinates[ a:b ])
 
-    for x, y in coordinates[1:]:
+    return coordinates
 
-        if not (x == x0 and y == y0):
-            delta_coords.append([ x - x0, y - y0 ])
-            x0 = x
-            y0 = y
-    
-    if len(delta_coords) == 1:
-        delta_coords.append([ 0, 0 ])
+def simplify_topology(topojson, min_weight):
+    """
+    Simplify a presimplified TopoJSON object,
+    see `topology(..., presimplify=True)`,
+    by masking out vertices of weight below `min_weight`.
 
-    return delta_coords
+    For a quantized topology, the result is the same as
+    `topology(..., simplification=min_weight)`.
 
-def delta_decode(delta_coords):
+    Returns
+    -------
 
-    x, y = delta_coords[0]
-    coordinates = [[ x, y ]]
+    topojson: dict-like TopoJSON object, without weights
+    """
 
-    for dx, dy in delta_coords[1:]:
-        x = x + dx
-        y = y + dy
-        coordinates.append([ x, y ])
+    deltas, offsets = flatten_arcs(topojson['arcs'])
+    n = len(deltas)
+    start = offsets[:-1]
 
-    return coordinates
+    # End points, and the [ 0, 0 ] padding of single vertex arcs, are kept
 
+    weights = np.full(n, np.inf)
+    interior = np.ones(n, dtype=np.bool_)
+    interior[start] = False
+    interior[ offsets[1:] - 1 ] = False
+    weights[interior] = list(chain.from_iterable(topojson['weights']))
 
-def component_geometry(coordinates, component):
+    keep = weights >= min_weight
+    coordinates = _absolute(deltas, offsets)[keep]
+    offsets = np.concatenate([ [ 0 ], np.cumsum(keep) ])[offsets]
+    start = offsets[:-1]
 
-    coords = list()
-    arc = component
-    
-    while arc:
+    deltas = coordinates.copy()
+    deltas[1:] -= coordinates[:-1]
+    deltas[start] = coordinates[start]
 
-        geom = arc_geometry(coordinates, arc.a, arc.b)
-        last_point = geom[-1]
-        coords.extend(geom[:-1])
-        arc = arc.next
+    # Drop repeated vertices, as `delta_encode` does,
+    # keeping a last [ 0, 0 ] delta for arcs left with one vertex
 
-    coords.append(last_point)
+    keep = np.any(deltas != 0, axis=1)
+    keep[start] = True
+    kept = np.add.reduceat(keep, start) if len(start) else start
+    keep[ (offsets[1:] - 1)[ kept == 1 ] ] = True
 
-    return coords
+    offsets = np.concatenate([ [ 0 ], np.cumsum(keep) ])[offsets]
+    deltas = deltas[keep]
 
-def delta(coordinates, arcs):
+    topo = { key: value for key, value in topojson.items() if key != 'weights' }
+    topo['arcs'] = [ deltas[ a:b ].tolist() for a, b in zip(offsets[:-1], offsets[1:]) ]
 
-    return map(delta_encode, map(partial(arc_geometry, coordinates), arcs))
+    return topo
 
-def map_geometries(arc_index, objects):
+class LazyArcs(object):
+    """
+    Sequence of decoded arcs, each decoded on first access
+    and cached.
 
-    def map_arc(arc):
+    Parameters
+    ----------
 
-        arcs = list()
-        current = arc
+    decode: callable
+        decode(i) returns the absolute coordinates of arc i
 
-        while current:
+    count: int
+        Number of arcs
+    """
 
-            start = current.a
-            end   = current.b
+    def __init__(self, decode, count):
 
-            if start > end:
-                index = -arc_index[(end, start)]
-            else:
-                index = arc_index[(start, end)]
+        self.decode = decode
+        self.count = count
+        self.cache = dict()
 
-            arcs.append(index)
-            current = current.next
+    def __len__(self):
+        return self.count
 
-        return arcs
+    def __getitem__(self, index):
 
-    def component_arcs(component):
+        if index not in self.cache:
+            self.cache[index] = self.decode(index)
 
-        component_type = component['type']
+        return self.cache[index]
 
-        if component_type == 'Point':
-            pass
+class LazyGeometry(Mapping):
+    """
+    Read-only GeoJSON geometry or feature,
+    whose coordinates are decoded from shared arcs on first access.
 
-        elif component_type == 'LineString':
-            component['arcs'] = map_arc(component['arcs'])
+    Parameters
+    ----------
 
-        elif component_type == 'Polygon':
-            component['arcs'] = map(map_arc, component['arcs'])
+    component: dict-like
+        TopoJSON geometry
 
-        elif component_type == 'MultiPoint':
-            pass
+    arcs: `LazyArcs`
+    """
 
-        elif component_type == 'MultiLineString':
-            component['arcs'] = map(map_arc, component['arcs'])
+    def __init__(self, component, arcs):
 
-        elif component_type == 'MultiPolygon':
-            component['arcs'] = [ map(map_arc, polygon) for polygon in component['arcs'] ]
+        self.component = component
+        self.arcs = arcs
+        self.geojson = None
 
-        elif component_type == 'GeometryCollection' or component_type == 'FeatureCollection':
-            for geometry in component['geometries']:
-                component_arcs(geometry)
+        component_type = component['type']
+        self.shell = dict()
 
-        elif component_type == 'Feature':
-            component_arcs(component['geometry'])
+        if component.has_key('properties'):
+            self.shell['type'] = 'Feature'
+            copy_key(component, self.shell, 'id', 'bbox', 'properties')
+            self.lazy_key = 'geometry'
+        elif component_type == 'GeometryCollection':
+            self.shell['type'] = component_type
+            self.lazy_key = 'geometries'
+        else:
+            self.shell['type'] = component_type
+            self.lazy_key = 'coordinates'
 
-        return component
+    def materialize(self):
 
-    if objects.has_key('type'):
-        
-        component_arcs(objects)
+        if self.geojson is None:
+            # unpack as the member of a collection,
+            # the same as in a non-lazy unpack
+            collection = { 'geometries': [ self.component ], 'type': 'GeometryCollection' }
+            self.geojson = unpack_objects(collection, self.arcs)['geometries'][0]
 
-    else:
+        return self.geojson
 
-        return { key: component_arcs(obj) for key, obj in objects.items() }
+    def __getitem__(self, key):
 
-    return objects
+        if key in self.shell:
+            return self.shell[key]
 
+        if key != self.lazy_key:
+            raise KeyError(key)
 
-def topology(geojson, quantization=1e6, simplification=0):
-    """
-    Convert GeoJSON to TopoJSON.
+        return self.materialize()[key]
 
-    Parameters
-    ----------
+    def __iter__(self):
+        return iter(list(self.shell) + [ self.lazy_key ])
 
-    geojson: dict-like
-        plain GeoJSON object
-        or dictionary of named GeoJSON objects
+    def __len__(self):
+        return len(self.shell) + 1
 
-    quantization: number, > 1
-        size of the grid used to round-off coordinates.
-        If <= 1, no quantization is used.
+def lazy_objects(objects, arcs):
+    """
+    Same as `unpack_objects`,
+    with each member of top-level collections as a `LazyGeometry`.
+    """
 
-    Returns
-    -------
+    def lazy_object(obj):
 
-    topojson: dict-like TopoJSON object
+        component_type = obj['type']
 
-    Notes
-    -----
+        if component_type == 'FeatureCollection':
+            o = {
+                'features': [ LazyGeometry(geometry, arcs) for geometry in obj['geometries'] ],
+                'type': component_type
+            }
+        elif component_type == 'GeometryCollection':
+            o = {
+                'geometries': [ LazyGeometry(geometry, arcs) for geometry in obj['geometries'] ],
+                'type': component_type
+            }
+        else:
+            return LazyGeometry(obj, arcs)
 
-    [1] Bostock, Mike (2013) How To Infer Topology
-        https://bost.ocks.org/mike/topology/
+        copy_key(obj, o, 'id', 'bbox', 'crs')
+        return o
 
-    [2] Bostock's Nodejs reference implementation
-        https://github.com/topojson/topojson-server/tree/6c1709b/src
-        BSD-3 Licensed
-    """
+    if objects.has_key('type'):
+        return lazy_object(objects)
 
-    coordinates, lines, rings, objects = extract(geojson)
+    return { key: lazy_object(obj) for key, obj in objects.items() }
 
-    minx = np.min(coordinates[:, 0])
-    miny = np.min(coordinates[:, 1])
-    maxx = np.max(coordinates[:, 0])
-    maxy = np.max(coordinates[:, 1])
+def unpack(topojson, lazy=False):
+    """
+    Convert TopoJSON object to GeoJSON.
 
-    if quantization > 1:
-        kx = (minx == maxx) and 1 or (maxx - minx)
-        ky = (miny == maxy) and 1 or (maxy - miny)
-        quantized = np.int32(np.round((coordinates - (minx, miny)) / (kx, ky) * quantization))
-    else:
-        kx = ky = 1
-        quantized = coordinates
+    Parameters
+    ----------
 
-    cut(quantized, lines, rings)
-    arcs = dedup(quantized, lines, rings)
-    arc_index = { (arc.a, arc.b): i+1 for i, arc in enumerate(arcs) }
+    topojson: dict-like TopoJSON object
 
-    if simplification > 0:
+    lazy: bool
+        If True, members of top-level collections are `LazyGeometry`
+        mappings, decoding coordinates only when accessed,
+        from arcs decoded once and shared between features.
+        Otherwise, all arcs are decoded at once, see `decode_arcs`.
+    """
 
-        arcs = map(delta_encode, simplify(map(partial(arc_geometry, quantized), arcs), simplification))
+    if not (topojson.has_key('type') and topojson['type'] == 'Topology'):
+        raise KeyError('Not a valid TopoJSON object')
 
-    else:
+    transform = topojson.get('transform')
 
-        arcs = delta(quantized, arcs)
+    if lazy:
 
-    topo = {
-        'arcs': arcs,
-        'objects': map_geometries(arc_index, objects),
-        'bbox': [ minx, miny, maxx, maxy ],
-        'type': 'Topology'
-    }
+        def decode(i):
+            deltas = np.array(topojson['arcs'][i]).reshape(-1, 2)
+            return decode_arcs(deltas, [ 0, len(deltas) ], transform)[0]
 
-    if quantization > 1:
+        arcs = LazyArcs(decode, len(topojson['arcs']))
+        return lazy_objects(topojson['objects'], arcs)
 
-        topo['transform'] = {
-            'scale': [ kx / quantization, ky / quantization ],
-            'translate': [ minx, miny ]
-        }
+    deltas, offsets = flatten_arcs(topojson['arcs'])
+    arcs = decode_arcs(deltas, offsets, transform)
 
-    return topo
+    return unpack_objects(topojson['objects'], arcs)
 
-def unpack(topojson):
-    """
-    Convert TopoJSON object to GeoJSON. 
+def unpack_objects(objects, arcs):
     """
+    Convert TopoJSON objects to GeoJSON,
+    given the decoded coordinates of each arc.
 
-    if not (topojson.has_key('type') and topojson['type'] == 'Topology'):
-        raise KeyError('Not a valid TopoJSON object')
-
-    geojson = dict()
+    Parameters
+    ----------
 
-    arcs = [ delta_decode(arc) for arc in topojson['arcs'] ]
+    objects: dict-like
+        'objects' field of a TopoJSON object
 
-    if topojson.has_key('transform'):
-        sx, sy = topojson['transform']['scale']
-        tx, ty = topojson['transform']['translate']
-        arcs = [ (np.array(arc) * (sx, sy)) + (tx, ty) for arc in arcs ]
-    else:
-        arcs = [ np.array(arc) for arc in arcs ]
+    arcs: sequence of numpy-arrays, shape (k, 2)
+        Absolute coordinates of each arc
+    """
 
     def unpack_linestring(geometry):
 
@@ -745,14 +1626,14 @@ def unpack(topojson):
         copy_key(obj, o, 'id', 'bbox', 'crs')
         return o
 
-    if topojson['objects'].has_key('type'):
+    if objects.has_key('type'):
 
-        geojson = unpack_object(topojson['objects'])
+        geojson = unpack_object(objects)
 
     else:
 
         geojson = { key: unpack_object(obj)
-                    for key, obj in topojson['objects'].items() }
+                    for key, obj in objects.items() }
 
     return geojson
 
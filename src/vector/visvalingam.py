@@ -1,112 +1,214 @@
+import numpy as np
 from heapq import heappop, heappush, heapify
-from functools import total_ordering
+from concurrent.futures import ProcessPoolExecutor
 
 def triangle_area(a, b, c):
+    """
+    Area of triangles (a, b, c),
+    given as (n, 2) arrays of vertex coordinates
+    """
 
-    return abs((a.x - c.x) * (b.y - a.y) - (a.x - b.x) * (c.y - a.y)) / 2
+    return np.abs((a[:, 0] - c[:, 0]) * (b[:, 1] - a[:, 1]) - (a[:, 0] - b[:, 0]) * (c[:, 1] - a[:, 1])) / 2
 
-class Point(object):
+def visvalingam_weights(coordinates):
+    """
+    Visvalingam effective area of each vertex of a linestring,
+    end points having infinite weight.
 
-    def __init__(self, x, y, z=0):
-        self.x = x
-        self.y = y
-        # do not store z, we don't need it
-        # self.z = z
+    Parameters
+    ----------
 
-class Triangle(object):
+    coordinates: array-like, shape (n, 2) or more columns
+        Linestring vertices, extra columns (z) are ignored
 
-    def __init__(self, a, b, c):
-        self.a = Point(*a)
-        self.b = Point(*b)
-        self.c = Point(*c)
-        # Store original b for later output
-        self.bo = b
-        self.weight = self.area
-        self.entry = None
+    Returns
+    -------
 
-    @property
-    def area(self):
-        return triangle_area(self.a, self.b, self.c)
+    numpy-array, shape (n,), dtype float64
+    """
 
-@total_ordering
-class QueueEntry(object):
+    return batch_weights(coordinates, [ 0, len(coordinates) ])
 
-    def __init__(self, index, triangle):
-        self.index = index
-        self.triangle = triangle
-        self.removed = False
-        triangle.entry = self
+def batch_weights(coordinates, offsets):
+    """
+    Visvalingam effective area of each vertex of many arcs at once,
+    arc end points having infinite weight.
 
-    def __lt__(self, other):
-        return self.triangle.weight < other.triangle.weight
+    Vertices are kept in an (n, 2) array,
+    with links to the previous and next remaining vertex in integer arrays,
+    and triangles of all arcs are queued as (area, vertex index) pairs
+    in a single heap with lazy deletion:
+    an entry is stale if its area is not the current area of its vertex.
+    Arc end points are never removed, so that links never cross arcs,
+    and the weights of each arc are the same as if it was simplified alone.
 
-    def __eq__(self, other):
-        return self.triangle.weight == other.triangle.weight
+    Parameters
+    ----------
 
+    coordinates: array-like, shape (n, 2) or more columns
+        Vertices of all arcs, one after the other,
+        extra columns (z) are ignored
 
-def pre_simplify(linestring):
+    offsets: array-like, dtype int
+        Start index of each arc in coordinates,
+        followed by the total number of vertices
+
+    Returns
+    -------
+
+    numpy-array, shape (n,), dtype float64
     """
-    Visvalingam's non-destructive line simplification
 
-    [1] Visvalingam, M. and J. D. Whyatt. (1992)
-        Line Generalisation By Repeated Elimination of Smallest Area.
-        Cartographic Information Systems Research Group, University of Hull.
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n = len(coordinates)
+    weights = np.full(n, np.inf)
 
-    [2] https://bost.ocks.org/mike/simplify/
+    if n == 0:
+        return weights
 
-    [3] https://github.com/topojson/topojson-simplify/blob/9c893b2/src/presimplify.js
-        BSD-3 Licensed
+    lengths = np.diff(offsets)
+    arc = np.repeat(np.arange(len(lengths)), lengths)
+
+    first = np.zeros(n, dtype=np.bool_)
+    first[ offsets[:-1][ lengths > 0 ] ] = True
+    last = np.zeros(n, dtype=np.bool_)
+    last[ offsets[1:][ lengths > 0 ] - 1 ] = True
+    interior = np.flatnonzero(~first & ~last)
+
+    xy = coordinates[ :, :2 ]
+    x = xy[ :, 0 ].tolist()
+    y = xy[ :, 1 ].tolist()
+
+    area = np.full(n, np.inf)
+    area[interior] = triangle_area(xy[interior-1], xy[interior], xy[interior+1])
+
+    previous = np.arange(-1, n-1)
+    following = np.arange(1, n+1)
+    removed = np.zeros(n, dtype=np.bool_)
+    max_weight = np.zeros(len(lengths))
+
+    heap = list(zip(area[interior].tolist(), interior.tolist()))
+    heapify(heap)
+
+    def area_at(a, b, c):
+        return abs((x[a] - x[c]) * (y[b] - y[a]) - (x[a] - x[b]) * (y[c] - y[a])) / 2
+
+    while heap:
+
+        w, i = heappop(heap)
+
+        if removed[i] or w != area[i]:
+            continue
+
+        removed[i] = True
+        k = arc[i]
+
+        if w < max_weight[k]:
+            w = max_weight[k]
+        else:
+            max_weight[k] = w
+
+        weights[i] = w
+
+        a = previous[i]
+        c = following[i]
+        following[a] = c
+        previous[c] = a
+
+        if not first[a]:
+            area[a] = wa = area_at(previous[a], a, c)
+            heappush(heap, (wa, a))
+
+        if not last[c]:
+            area[c] = wc = area_at(a, c, following[c])
+            heappush(heap, (wc, c))
+
+    return weights
+
+def _batch_weights_range(args):
+    """ Worker process entry point for `simplify_arcs`
+    """
+
+    coordinates, offsets = args
+    return batch_weights(coordinates, offsets)
+
+def simplify_arcs(coordinates, offsets, min_weight, processes=1, chunks=None):
+    """
+    Simplify many arcs at once.
+
+    Parameters
+    ----------
+
+    coordinates: array-like, shape (n, 2)
+        Vertices of all arcs, one after the other
+
+    offsets: array-like, dtype int
+        Start index of each arc in coordinates,
+        followed by the total number of vertices
+
+    min_weight: float
+        Minimum Visvalingam weight of vertices to keep
+
+    processes: int
+        Number of worker processes,
+        each processing a range of arcs
+
+    chunks: int
+        Number of arc ranges to split the work into,
+        defaults to 4 ranges per process
+
+    Returns
+    -------
+
+    Boolean mask of vertices to keep, shape (n,)
     """
 
-    if len(linestring) > 2:
+    coordinates = np.asarray(coordinates)
+    offsets = np.asarray(offsets, dtype=np.int64)
+
+    if processes <= 1:
+        return batch_weights(coordinates, offsets) >= min_weight
+
+    if chunks is None:
+        chunks = 4 * processes
 
-        triangles = [ Triangle(a, b, c)
-                      for a, b, c
-                      in zip(linestring[:-2], linestring[1:-1], linestring[2:]) ]
+    # Split arcs into ranges of about the same number of vertices
 
-        heap = heapify([ QueueEntry(i, t) for i, t in enumerate(triangles) ])
-        max_weight = 0
+    narcs = len(offsets) - 1
+    bounds = np.searchsorted(offsets, np.linspace(0, offsets[-1], chunks + 1)[1:-1])
+    bounds = np.unique(np.concatenate([ [ 0 ], np.minimum(bounds, narcs), [ narcs ] ]))
 
-        while heap:
+    tasks = [ (coordinates[ offsets[a]:offsets[b] ], offsets[ a:b+1 ] - offsets[a])
+              for a, b in zip(bounds[:-1], bounds[1:]) ]
 
-            entry = heappop(heap)
-            if entry.removed:
-                continue
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        weights = list(executor.map(_batch_weights_range, tasks))
 
-            i = entry.index
-            triangle = entry.triangle
-            w = triangle.weight
+    return np.concatenate(weights) >= min_weight
 
-            if w < max_weight:
-                triangle.weight = max_weight
-            else:
-                max_weight = w
+def pre_simplify(linestring):
+    """
+    Visvalingam's non-destructive line simplification
 
-            if i > 0:
+    Returns
+    -------
 
-                t = triangles[i-1]
-                t.c = triangle.c
-                t.weight = t.area
-                t.entry.removed = True
-                heappush(heap, QueueEntry(i-1, t))
-                
+    List of (point, weight) tuples, see `visvalingam_weights`
 
-            if i < len(triangles)-1:
-                
-                t = triangles[i+1]
-                t.a = triangle.a
-                t.weight = t.area
-                t.entry.removed = True
-                heappush(heap, QueueEntry(i+1, t))
+    [1] Visvalingam, M. and J. D. Whyatt. (1992)
+        Line Generalisation By Repeated Elimination of Smallest Area.
+        Cartographic Information Systems Research Group, University of Hull.
 
-        start = (linestring[0], float('inf'))
-        end = (linestring[-1], float('inf'))
-        return [ start ] + [ (t.bo, t.weight) for t in triangles ] + [ end ]
+    [2] https://bost.ocks.org/mike/simplify/
 
-    else:
+    [3] https://github.com/topojson/topojson-simplify/blob/9c893b2/src/presimplify.js
+        BSD-3 Licensed
+    """
 
-        return zip(linestring, [ float('inf') ] * len(linestring))
+    return list(zip(linestring, visvalingam_weights(linestring).tolist()))
 
 def simplify(linestring, min_weight):
 
-    return [ p for p, weight in filter(lambda x: x[1] >= min_weight, pre_simplify(linestring)) ]
+    weights = visvalingam_weights(linestring)
+    return [ p for p, weight in zip(linestring, weights) if weight >= min_weight ]
@@ -0,0 +1,13 @@
+# coding: utf-8
+""" Put the flat module directories on sys.path,
+    as benchmarks.run does
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for module_path in ('src/ta', 'src/vector'):
+    if os.path.join(ROOT, module_path) not in sys.path:
+        sys.path.insert(0, os.path.join(ROOT, module_path))
@@ -0,0 +1,21 @@
+# coding: utf-8
+
+import numpy as np
+
+from algs import watersheds, upslope
+
+def test_watersheds_outlet_on_a_cycle():
+    """ Outlet (0, 2) is on the cycle (0, 1) <-> (0, 2),
+    drained by (0, 0) and (1, 1)
+    """
+
+    flowdir = np.array([ [ 4, 4, 64 ], [ 16, 1, 0 ] ], dtype=np.uint8)
+
+    out, counts = watersheds(flowdir, [ 0, 1 ], [ 2, 0 ], [ 7, 8 ])
+
+    assert np.array_equal(out, [ [ 7, 7, 7 ], [ 8, 7, 0 ] ])
+    assert list(counts) == [ 4, 1 ]
+
+    expected, count = upslope(flowdir, 0, 2, 7)
+    assert np.array_equal(out == 7, expected == 7)
+    assert count == counts[0]
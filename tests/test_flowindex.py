@@ -0,0 +1,22 @@
+# coding: utf-8
+
+import numpy as np
+
+from flowindex import FlowIndex
+
+def test_cells_draining_to_a_cycle_are_not_indexed():
+    """ (0, 0) drains to the cycle (0, 1) <-> (0, 2),
+    (1, 0) is an outlet
+    """
+
+    flowdir = np.array([ [ 4, 4, 64 ], [ 16, 0, 0 ] ], dtype=np.uint8)
+    index = FlowIndex.build(flowdir)
+
+    assert index.preorder[ 0, 0 ] == -1
+    assert index.size[ 0, 0 ] == 0
+    assert index.preorder[ 1, 0 ] == 0
+    assert index.size[ 1, 0 ] == 1
+
+    assert not index.is_upstream(0, 0, 1, 0)
+    assert not index.is_upstream(1, 0, 0, 0)
+    assert not np.any(index.upslope_mask(0, 0))
@@ -0,0 +1,48 @@
+# coding: utf-8
+
+from topology import topology
+from parallel import topology_parallel
+from incremental import IncrementalTopology
+
+SQUARE = [ [ 0.0, 0.0 ], [ 1.0, 0.0 ], [ 1.0, 1.0 ], [ 0.0, 1.0 ], [ 0.0, 0.0 ] ]
+
+def polygons(*rings):
+
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'id': i,
+                'properties': {},
+                'geometry': { 'type': 'Polygon', 'coordinates': [ ring ] }
+            }
+            for i, ring in enumerate(rings)
+        ]
+    }
+
+def ring_arcs(topo):
+
+    return [ geometry['arcs'][0] for geometry in topo['objects']['geometries'] ]
+
+def test_whole_ring_shares_closed_loop_arc():
+    """ A ring left whole and the same ring cut into a closed loop arc,
+    at a repeated first vertex, share one arc
+    """
+
+    geojson = polygons(SQUARE, SQUARE[:1] + SQUARE)
+
+    for topo in (topology(geojson, 1e4), topology_parallel(geojson, 1e4, processes=1, tiles=2)):
+
+        assert len(topo['arcs']) == 2
+        assert ring_arcs(topo) == [ [ 1 ], [ 2, 1 ] ]
+
+def test_incremental_whole_ring_shares_closed_loop_arc():
+
+    geojson = polygons(SQUARE, SQUARE[:1] + SQUARE)
+    incremental = IncrementalTopology([ 0.0, 0.0, 1.0, 1.0 ], 1e4)
+
+    for feature in geojson['features']:
+        incremental.add(feature)
+
+    assert len(incremental.to_topojson()['arcs']) == 2